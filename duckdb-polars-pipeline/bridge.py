@@ -0,0 +1,87 @@
+# Arrow handoff between Polars and DuckDB. Both sides keep columns as Arrow buffers, so a frame can
+# cross over by reference instead of being converted: Polars exports with CompatLevel.newest() (its
+# strings are string_view, the default export rewrites them as large_string), DuckDB is told to
+# produce string_view too, and results come back as a stream of record batches rather than one
+# materialized table. STATS counts the bytes of the batches DuckDB returned and how many of them the
+# resulting Polars frames still point at. What DuckDB does with a registered frame's buffers happens
+# inside its scan and cannot be seen from here, so that direction is not counted.
+import duckdb
+import polars as pl
+import pyarrow as pa
+
+BATCH_ROWS = 122_880  # DuckDB's row group size: one batch per row group
+STATS = {"batches": 0, "rows": 0, "bytes": 0, "shared": 0}
+
+
+def connect(database=":memory:"):
+    """A DuckDB connection whose Arrow output Polars can take without converting strings"""
+    conn = duckdb.connect(database)
+    conn.execute("SET arrow_output_version = '1.4'")
+    conn.execute("SET produce_arrow_string_view = true")
+    return conn
+
+
+def arrow_buffers(data):
+    """{address: size} of every buffer behind an Arrow table or record batch"""
+    columns = data.columns if isinstance(data, pa.Table) else [pa.chunked_array([c]) for c in data.columns]
+    return {
+        buf.address: buf.size
+        for column in columns for chunk in column.chunks for buf in chunk.buffers() if buf is not None
+    }
+
+
+def track(batch, df):
+    """Count the batch's buffers, and those the DataFrame made from it still points at, i.e. the
+    copies avoided"""
+    # Polars' newest-level export hands out its own buffers, so its addresses are the frame's
+    target = arrow_buffers(export(df))
+    for address, size in arrow_buffers(batch).items():
+        STATS["bytes"] += size
+        STATS["shared"] += size if address in target else 0
+    STATS["batches"] += 1
+    STATS["rows"] += batch.num_rows
+
+
+def export(frame):
+    return frame.to_arrow(compat_level=pl.CompatLevel.newest())
+
+
+def register(conn, name, frame, batch_rows=BATCH_ROWS):
+    """Expose a Polars frame to DuckDB as view name, by reference.
+
+    A DataFrame is registered as the Arrow table over its own buffers. A LazyFrame is registered as a
+    record batch stream fed by its streaming engine, so DuckDB consumes it as it is produced; such a
+    view can be scanned once.
+    """
+    if isinstance(frame, pl.LazyFrame):
+        schema = export(pl.DataFrame(schema=frame.collect_schema())).schema
+        frames = frame.collect_batches(chunk_size=batch_rows, engine="streaming")
+        stream = (batch for df in frames for batch in export(df).to_batches())
+        conn.register(name, pa.RecordBatchReader.from_batches(schema, stream))
+    else:
+        conn.register(name, export(frame))
+
+
+def batches(conn, sql, batch_rows=BATCH_ROWS):
+    """Polars DataFrames over the result of sql, one Arrow record batch at a time"""
+    result = conn.execute(sql)
+    # to_arrow_reader() is fetch_record_batch() from DuckDB 1.5 on
+    reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)(batch_rows)
+    for batch in reader:
+        df = pl.from_arrow(batch, rechunk=False)
+        track(batch, df)
+        yield df
+
+
+def collect(conn, sql, batch_rows=BATCH_ROWS):
+    """The result of sql as one DataFrame made of the fetched batches, without rechunking them"""
+    frames = list(batches(conn, sql, batch_rows))
+    if not frames:
+        return conn.execute(sql).pl()
+    return pl.concat(frames, rechunk=False)
+
+
+def report():
+    unit, size = ("MB", 1024 ** 2) if STATS["bytes"] >= 1024 ** 2 else ("KB", 1024)
+    print(f"🔁 DuckDB → Polars: {STATS['batches']} batches, {STATS['rows']} rows, "
+          f"{STATS['shared'] / size:.1f} of {STATS['bytes'] / size:.1f} {unit} passed without a copy")
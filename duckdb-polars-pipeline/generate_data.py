@@ -2,19 +2,109 @@ import polars as pl
 from faker import Faker
 import random
 import os
+import shutil
+import argparse
+import multiprocessing
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
 from utils import measure_performance
 
-@measure_performance
-def generate_data():
+NUM_CUSTOMERS = 500
+NUM_ORDERS = 10000
+SHARD_SIZE = 2500  # rows per worker file; output depends on this, not on the worker count
+SEED = 42
+POOL_SIZE = 1000  # distinct Faker values per column in fast faker mode
+
+CUSTOMERS_DIR = 'data/warehouse/customers'
+ORDERS_DIR = 'data/warehouse/orders'
+
+segments = ['high_value', 'medium_value', 'low_value', 'undefined']
+countries = ['USA', 'Canada', 'Mexico', 'Brazil', 'Argentina']
+statuses = ['pending', 'shipped', 'delivered', 'cancelled']
+payment_methods = ['credit_card', 'paypal', 'bank_transfer']
+
+# Low-cardinality columns are written as Enums: dictionary-encoded in Parquet and read back as Enum
+# by scan_parquet, so filters and group-bys on them compare integer codes rather than strings
+CUSTOMER_ENUMS = {'country': pl.Enum(countries), 'segment': pl.Enum(segments)}
+ORDER_ENUMS = {'status': pl.Enum(statuses), 'payment_method': pl.Enum(payment_methods)}
+
+
+def shard_generators(kind, shard):
+    """Faker and random.Random seeded from (SEED, kind, shard) so shards are reproducible."""
+    shard_seed = f"{SEED}-{kind}-{shard}"
     fake = Faker()
+    fake.seed_instance(shard_seed)
+    return fake, random.Random(shard_seed)
 
-    # Generate customers
-    customers = []
 
-    segments = ['high_value', 'medium_value', 'low_value', 'undefined']
-    countries = ['USA', 'Canada', 'Mexico', 'Brazil', 'Argentina']
+def shards(total):
+    """Split [0, total) into (shard, start, count) ranges of SHARD_SIZE rows."""
+    return [(shard, start, min(SHARD_SIZE, total - start))
+            for shard, start in enumerate(range(0, total, SHARD_SIZE))]
+
+
+def build_pools():
+    """Fast faker mode: call Faker a bounded number of times, up front."""
+    fake = Faker()
+    fake.seed_instance(SEED)
+    today = date.today()
+    return {
+        'first_name': [fake.first_name() for _ in range(POOL_SIZE)],
+        'last_name': [fake.last_name() for _ in range(POOL_SIZE)],
+        'email': [fake.email() for _ in range(POOL_SIZE)],
+        'phone': [fake.phone_number() for _ in range(POOL_SIZE)],
+        'street_address': [fake.street_address() for _ in range(POOL_SIZE)],
+        # half of the customers have no second address line
+        'address_line_2': [fake.secondary_address() for _ in range(POOL_SIZE)] + [''] * POOL_SIZE,
+        'city': [fake.city() for _ in range(POOL_SIZE)],
+        'state': [fake.state() for _ in range(POOL_SIZE)],
+        'zip_code': [fake.zipcode() for _ in range(POOL_SIZE)],
+        'full_address': [f"{fake.street_address()}, {fake.city()}, {fake.state()} {fake.zipcode()}"
+                         for _ in range(POOL_SIZE)],
+        'item_details': [f"Item {item} x{qty}" for item in range(1, 101) for qty in range(1, 6)],
+        'registration_date': pl.date_range(date(today.year - today.year % 10, 1, 1), today, eager=True),
+        'order_date': pl.date_range(date(today.year, 1, 1), today, eager=True),
+    }
+
+
+# Per-process pools, set by the pool initializer (None outside fast faker mode)
+pools = None
+
+def init_worker(worker_pools):
+    global pools
+    pools = worker_pools
+
 
-    for i in range(500):
+def draw(values, n, rng):
+    """Vectorized sample with replacement from a pool of values."""
+    return pl.Series(values).sample(n, with_replacement=True, seed=rng.getrandbits(32))
+
+
+def generate_customers_shard(task):
+    shard, start, count = task
+    fake, rng = shard_generators('customers', shard)
+
+    if pools is not None:
+        df_customers = pl.DataFrame({
+            'customer_id': pl.int_range(start + 1, start + count + 1, eager=True),
+            'first_name': draw(pools['first_name'], count, rng),
+            'last_name': draw(pools['last_name'], count, rng),
+            'email': draw(pools['email'], count, rng),
+            'phone': draw(pools['phone'], count, rng),
+            'address_line_1': draw(pools['street_address'], count, rng),
+            'address_line_2': draw(pools['address_line_2'], count, rng),
+            'city': draw(pools['city'], count, rng),
+            'state': draw(pools['state'], count, rng),
+            'zip_code': draw(pools['zip_code'], count, rng),
+            'country': draw(countries, count, rng),
+            'segment': draw(segments, count, rng),
+            'registration_date': draw(pools['registration_date'], count, rng),
+        })
+        df_customers.cast(CUSTOMER_ENUMS).write_parquet(f'{CUSTOMERS_DIR}/part-{shard:05d}.parquet')
+        return count
+
+    customers = []
+    for i in range(start, start + count):
         customer = {
             'customer_id': i + 1,
             'first_name': fake.first_name(),
@@ -22,45 +112,80 @@ def generate_data():
             'email': fake.email(),
             'phone': fake.phone_number(),
             'address_line_1': fake.street_address(),
-            'address_line_2': fake.secondary_address() if random.choice([True, False]) else '',
+            'address_line_2': fake.secondary_address() if rng.choice([True, False]) else '',
             'city': fake.city(),
             'state': fake.state(),
             'zip_code': fake.zipcode(),
-            'country': random.choice(countries),
-            'segment': random.choice(segments),
+            'country': rng.choice(countries),
+            'segment': rng.choice(segments),
             'registration_date': fake.date_this_decade()
         }
         customers.append(customer)
 
-    df_customers = pl.DataFrame(customers)
-    os.makedirs('data/warehouse/customers', exist_ok=True)
-    df_customers.write_parquet('data/warehouse/customers/customers.parquet')
+    pl.DataFrame(customers).cast(CUSTOMER_ENUMS).write_parquet(f'{CUSTOMERS_DIR}/part-{shard:05d}.parquet')
+    return count
 
-    # Generate orders
-    orders = []
-    statuses = ['pending', 'shipped', 'delivered', 'cancelled']
-    payment_methods = ['credit_card', 'paypal', 'bank_transfer']
 
-    for i in range(10000):
-        customer_id = random.randint(1, 500)
+def generate_orders_shard(task):
+    shard, start, count = task
+    fake, rng = shard_generators('orders', shard)
+
+    # order_id comes from the shard's own disjoint range
+    if pools is not None:
+        df_orders = pl.DataFrame({
+            'order_id': pl.int_range(start + 1, start + count + 1, eager=True),
+            'customer_id': draw(range(1, NUM_CUSTOMERS + 1), count, rng),
+            'order_date': draw(pools['order_date'], count, rng),
+            'amount': draw(range(1000, 100001), count, rng) / 100,
+            'status': draw(statuses, count, rng),
+            'payment_method': draw(payment_methods, count, rng),
+            'shipping_address': draw(pools['full_address'], count, rng),
+            'billing_address': draw(pools['full_address'], count, rng),
+            'item_details': draw(pools['item_details'], count, rng),
+        })
+        df_orders.cast(ORDER_ENUMS).write_parquet(f'{ORDERS_DIR}/part-{shard:05d}.parquet')
+        return count
+
+    orders = []
+    for i in range(start, start + count):
+        customer_id = rng.randint(1, NUM_CUSTOMERS)
         order = {
             'order_id': i + 1,
             'customer_id': customer_id,
             'order_date': fake.date_this_year(),
-            'amount': round(random.uniform(10, 1000), 2),
-            'status': random.choice(statuses),
-            'payment_method': random.choice(payment_methods),
+            'amount': round(rng.uniform(10, 1000), 2),
+            'status': rng.choice(statuses),
+            'payment_method': rng.choice(payment_methods),
             'shipping_address': f"{fake.street_address()}, {fake.city()}, {fake.state()} {fake.zipcode()}",
             'billing_address': f"{fake.street_address()}, {fake.city()}, {fake.state()} {fake.zipcode()}",
-            'item_details': f"Item {random.randint(1, 100)} x{random.randint(1, 5)}"
+            'item_details': f"Item {rng.randint(1, 100)} x{rng.randint(1, 5)}"
         }
         orders.append(order)
 
-    df_orders = pl.DataFrame(orders)
-    os.makedirs('data/warehouse/orders', exist_ok=True)
-    df_orders.write_parquet('data/warehouse/orders/orders.parquet')
+    pl.DataFrame(orders).cast(ORDER_ENUMS).write_parquet(f'{ORDERS_DIR}/part-{shard:05d}.parquet')
+    return count
+
+
+@measure_performance
+def generate_data(workers=None, fast_faker=False):
+    # Start from empty directories so stale parts are not picked up by the glob scans
+    for directory in (CUSTOMERS_DIR, ORDERS_DIR):
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+    # Each worker writes its own Parquet part; spawn, since forking after Polars starts its thread pool can deadlock
+    worker_pools = build_pools() if fast_faker else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=init_worker, initargs=(worker_pools,)) as pool:
+        num_customers = sum(pool.map(generate_customers_shard, shards(NUM_CUSTOMERS)))
+        num_orders = sum(pool.map(generate_orders_shard, shards(NUM_ORDERS)))
 
-    print("Data generation complete. Files: customers.parquet and orders.parquet")
+    print(f"Data generation complete. {num_customers} customers in {CUSTOMERS_DIR}, "
+          f"{num_orders} orders in {ORDERS_DIR}")
 
 if __name__ == "__main__":
-    generate_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate customers and orders Parquet files")
+    parser.add_argument("--fast-faker", action="store_true",
+                        help="sample from pre-generated Faker pools instead of calling Faker per row")
+    args = parser.parse_args()
+    generate_data(fast_faker=args.fast_faker)
@@ -1,16 +1,38 @@
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import polars as pl
+from polars.testing import assert_frame_equal
 from utils import measure_performance
-import duckdb
+import bridge
 
+ORDERS = "data/warehouse/orders/*.parquet"
+CUSTOMERS = "data/warehouse/customers/*.parquet"
+METRICS = "data/stage/metrics.parquet"  # --sink writes the aggregated metrics here
 
-@measure_performance
-def main():
+TOP_SEGMENTS = """
+    SELECT
+        country,
+        segment,
+        gmv,
+        orders,
+        ROW_NUMBER() OVER (
+            PARTITION BY country
+            ORDER BY gmv DESC
+        ) as rank_in_country
+    FROM metrics
+    QUALIFY rank_in_country <= 3
+    ORDER BY country, rank_in_country
+"""
+
+
+def build_pipeline():
     # Lazy scan of a partitioned dataset
-    df_orders = pl.scan_parquet("data/warehouse/orders/orders.parquet")
-    df_customers = pl.scan_parquet("data/warehouse/customers/customers.parquet")
+    df_orders = pl.scan_parquet(ORDERS)
+    df_customers = pl.scan_parquet(CUSTOMERS)
 
     # Build a lazy pipeline
-    pipeline = (
+    return (
         df_orders
         .filter(pl.col("status") == "delivered")
         .with_columns(
@@ -33,30 +55,94 @@ def main():
         ])
     )
 
-    # Execute the pipeline
-    result = pipeline.collect()
+
+def top_segments(metrics, sink=False):
+    """Rank segments per country in DuckDB, from the metrics frame or the sunk Parquet file.
+
+    The frame and the ranked result cross between Polars and DuckDB as Arrow buffers (see bridge.py).
+    """
+    conn = bridge.connect()
+    if sink:
+        conn.execute(f"CREATE VIEW metrics AS SELECT * FROM read_parquet('{METRICS}')")
+    else:
+        bridge.register(conn, "metrics", metrics)
+    return bridge.collect(conn, TOP_SEGMENTS)
+
+
+def run_polars(engine, sink=False):
+    pipeline = build_pipeline()
+    if sink:
+        # The aggregate goes to disk as it is produced and DuckDB reads it from there
+        pipeline.sink_parquet(METRICS, engine=engine, mkdir=True)
+        return top_segments(None, sink=True)
+    if engine == "streaming":
+        # DuckDB reads the aggregate batch by batch as the streaming engine emits it
+        return top_segments(pipeline)
+    result = pipeline.collect(engine=engine)
     print(result)
+    return top_segments(result)
+
+
+@measure_performance
+def polars_in_memory(sink=False):
+    return run_polars("in-memory", sink)
 
-    # using duckdb
-    conn = duckdb.connect()
-    conn.register("metrics", result.to_arrow())
-    
-    top_segment = conn.execute("""
-        SELECT
-            country,
-            segment,
-            gmv,
-            orders,
-            ROW_NUMBER() OVER (
-                PARTITION BY country
-                ORDER BY gmv DESC
-            ) as rank_in_country
-        FROM metrics
-        QUALIFY rank_in_country <= 3
-    """).pl()
 
+@measure_performance
+def polars_streaming(sink=False):
+    """Polars' streaming engine: scans, filter, join and group_by run in batches, not on whole frames"""
+    return run_polars("streaming", sink)
+
+
+@measure_performance
+def duckdb_only(sink=False):
+    """The same query as one DuckDB plan, spilling to disk past its memory limit"""
+    conn = bridge.connect()
+    conn.execute(f"""
+        CREATE VIEW metrics AS
+        SELECT c.country, c.segment, SUM(o.amount::DOUBLE) AS gmv, COUNT(o.order_id) AS orders
+        FROM read_parquet('{ORDERS}') o
+        JOIN read_parquet('{CUSTOMERS}') c USING (customer_id)
+        WHERE o.status = 'delivered'
+        GROUP BY c.country, c.segment
+    """)
+    return bridge.collect(conn, TOP_SEGMENTS)
+
+
+ENGINES = {"in-memory": polars_in_memory, "streaming": polars_streaming, "duckdb": duckdb_only}
+
+
+def run(engine, sink=False):
+    top_segment = ENGINES[engine](sink)
     print(top_segment)
+    bridge.report()
+    return top_segment
+
+
+def compare(sink=False):
+    """Run every engine in a fresh process, so each peak RSS is that engine's own, and check they agree"""
+    results = {}
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"),
+                             max_tasks_per_child=1) as pool:
+        for engine in ENGINES:
+            results[engine] = pool.submit(run, engine, sink).result()
+    for engine, result in list(results.items())[1:]:
+        try:
+            # Float sums differ in the last bits with the order rows are added in
+            assert_frame_equal(result, results["in-memory"], check_dtypes=False)
+            print(f"{engine}: matches in-memory")
+        except AssertionError as e:
+            print(f"{engine}: DIFFERS from in-memory: {e}")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Orders GMV per country and segment, top 3 segments per country")
+    parser.add_argument("--engine", choices=[*ENGINES, "compare"], default="in-memory",
+                        help="Polars in-memory or streaming engine, an all-DuckDB plan, or all three")
+    parser.add_argument("--sink", action="store_true",
+                        help=f"Polars engines write the aggregate to {METRICS} instead of collecting it")
+    args = parser.parse_args()
+    if args.engine == "compare":
+        compare(args.sink)
+    else:
+        run(args.engine, args.sink)
@@ -1,27 +1,31 @@
 import os
-from time import time
+import resource
+import sys
 import psutil
 from functools import wraps
-from timeit import default_timer as timer
+from time import perf_counter
 
 
 def measure_performance(func):
-    """Measure execution time and memory usage."""
+    """Measure wall time, CPU time and memory usage."""
     @wraps(func)
     def wrapper(*args, **kwargs):
         process = psutil.Process(os.getpid())
         mem_before: float = process.memory_info().rss / (1024 ** 2)  # in MB
+        cpu_before = process.cpu_times()
 
-        start: float = time()
+        start: float = perf_counter()
         result = func(*args, **kwargs)
+        elapsed_time: float = perf_counter() - start
 
-        end = timer()
-        elapsed_time = end - start
-
+        cpu_after = process.cpu_times()
+        cpu_time: float = (cpu_after.user + cpu_after.system) - (cpu_before.user + cpu_before.system)
         mem_after: float = process.memory_info().rss / (1024 ** 2)  # in MB
         mem_used: float = mem_after - mem_before
+        peak: float = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        peak = peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
 
-        print(f"⏱ {func.__name__} took {elapsed_time:.2f}s, "
-              f"used {mem_used:.1f} MB\n")
+        print(f"⏱ {func.__name__} took {elapsed_time:.2f}s (cpu {cpu_time:.2f}s), "
+              f"used {mem_used:.1f} MB, peak RSS {peak:.0f} MB\n")
         return result
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -1,58 +1,253 @@
+import argparse
 import duckdb
 import os
 import json
+import hashlib
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from tabulate import tabulate
 
 # Define constants for file paths
 DB_PATH = 'urbancycle_warehouse.duckdb'
 ORDERS_CSV = 'orders_data.csv'
 PRODUCTS_JSON = 'product_inventory.json'
+REPORT_BATCH_ROWS = 10_000  # report rows fetched per Arrow record batch
+TEMP_DIR = 'tmp'  # joins, aggregates and sorts past memory_limit spill here
 
-def run_et_phase():
-    """Connects to DuckDB and loads raw data from CSV and JSON."""
+# HyperLogLog sketch of the customers in a report group: 2^SKETCH_BITS one-byte registers, each the
+# highest rank (leading zeros + 1) of the customer_id hashes falling into it. Registers merge by
+# element-wise max, so sketches of new orders fold into stored ones; ~1.04 / sqrt(2^SKETCH_BITS)
+# standard error (about 1.6%).
+SKETCH_BITS = 12
+REGISTERS = 2 ** SKETCH_BITS
+RANK_BITS = 64 - SKETCH_BITS
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+HLL_MACROS = [
+    f"CREATE OR REPLACE MACRO hll_bucket(h) AS (h >> {RANK_BITS})",
+    f"""CREATE OR REPLACE MACRO hll_rank(h) AS (CASE
+        WHEN h & {2 ** RANK_BITS - 1}::UBIGINT = 0 THEN {RANK_BITS + 1}
+        ELSE {RANK_BITS} - floor(log2((h & {2 ** RANK_BITS - 1}::UBIGINT)::DOUBLE))::INTEGER
+    END)::UTINYINT""",
+    """CREATE OR REPLACE MACRO hll_merge(a, b) AS (CASE
+        WHEN a IS NULL THEN b WHEN b IS NULL THEN a
+        ELSE list_transform(list_zip(a, b), r -> greatest(r[1], r[2]))
+    END)""",
+    # Raw estimate, or linear counting over the empty registers while the count is small
+    f"""CREATE OR REPLACE MACRO hll_estimate(regs) AS round(CASE
+        WHEN {ALPHA}::DOUBLE * {REGISTERS ** 2} / list_sum(list_transform(regs, r -> pow(2.0, -r::INTEGER))) <= {2.5 * REGISTERS}
+             AND list_count(list_filter(regs, r -> r = 0)) > 0
+        THEN {REGISTERS} * ln({REGISTERS} / list_count(list_filter(regs, r -> r = 0)))
+        ELSE {ALPHA}::DOUBLE * {REGISTERS ** 2} / list_sum(list_transform(regs, r -> pow(2.0, -r::INTEGER)))
+    END)::BIGINT""",
+]
 
-    print("\n--- Starting EL Phase (Extract & Load) ---")
+def get_connection():
+    """Opens the warehouse once; both phases share this connection and its settings."""
+    conn = duckdb.connect(DB_PATH)
+    conn.execute(f"SET threads = {os.cpu_count()}")
+    conn.execute("SET memory_limit = '4GB'")
+    conn.execute(f"SET temp_directory = '{TEMP_DIR}'")
+    conn.execute("SET max_temp_directory_size = '100GB'")
+    # Stored in the warehouse, so views over the sketches work from any client
+    for macro in HLL_MACROS:
+        conn.execute(macro)
+    return conn
 
-    # Use 'with' for safe connection management
+def phase_fingerprint(phase, *files, upstream="", contents=()):
+    """Hash of a phase's code, its source files' size/mtime and the fingerprint of the phase before it.
+
+    The code is the whole module's source, so the report SQL, the macros and the load_* helpers a
+    phase calls count as well as the phase function itself. Files in contents are fingerprinted by
+    size and content_hash instead, so a rewrite that restores an older mtime still counts as a change.
+    """
+    digest = hashlib.sha256((inspect.getsource(inspect.getmodule(phase)) + upstream).encode())
+    for path in [*files, *contents]:
+        if not os.path.exists(path):
+            digest.update(f"{path}:missing".encode())
+        elif path in contents:
+            digest.update(f"{path}:{os.path.getsize(path)}:{content_hash(path)}".encode())
+        else:
+            stat = os.stat(path)
+            digest.update(f"{path}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+def is_unchanged(conn, phase, fingerprint):
+    """True if the phase last succeeded with this fingerprint, so its tables are already current."""
+    conn.execute("CREATE TABLE IF NOT EXISTS etl_runs (phase VARCHAR PRIMARY KEY, fingerprint VARCHAR)")
+    return conn.execute("SELECT fingerprint FROM etl_runs WHERE phase = ?", [phase]).fetchone() == (fingerprint,)
+
+def record_run(conn, phase, fingerprint):
+    conn.execute("INSERT OR REPLACE INTO etl_runs VALUES (?, ?)", [phase, fingerprint])
+
+def table_exists(conn, schema, table):
+    return conn.execute(
+        "SELECT count(*) FROM duckdb_tables() WHERE schema_name = ? AND table_name = ?", [schema, table]
+    ).fetchone()[0] > 0
+
+def run_phase(conn, name, phase, fingerprint, force=False):
+    """Runs a phase unless its inputs and code are unchanged since its last successful run."""
+    if not force and is_unchanged(conn, name, fingerprint):
+        print(f"\n--- {name} phase unchanged since last run, skipped ---")
+        return True
+    if not phase(conn):
+        return False
+    record_run(conn, name, fingerprint)
+    return True
+
+def content_hash(path):
+    """sha256 of a file's bytes: unlike size/mtime, unchanged by a rewrite of the same content."""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def load_products(conn):
+    """Maintains raw_layer.products_flat as a type 2 slowly-changing dimension of the JSON products.
+
+    A product whose attributes changed gets its open version closed at today's date and a new
+    version valid from today, so an order joins the version valid at its sale_date; a product's
+    first version is valid from -infinity. raw_layer.active_products holds just the active versions
+    and the columns the report joins on.
+    """
+    products_hash = content_hash(PRODUCTS_JSON)
+    if table_exists(conn, "raw_layer", "products_flat") and is_unchanged(conn, "products", products_hash):
+        print(f"{PRODUCTS_JSON} unchanged, products not reloaded")
+        return 0
+
+    versioned = conn.execute("""
+        SELECT count(*) FROM duckdb_columns()
+        WHERE schema_name = 'raw_layer' AND table_name = 'products_flat' AND column_name = 'valid_to'
+    """).fetchone()[0]
+    if not versioned:
+        # A products_flat from before versions were kept: its history starts over
+        conn.execute("DROP TABLE IF EXISTS raw_layer.products_flat")
+
+    # We treat the JSON file as a source table.
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE raw_layer.products AS
+        SELECT * FROM read_json_auto('{PRODUCTS_JSON}')
+    """)
+
+    # Now, flatten the JSON structure, with a hash of each product's attributes to spot changes
+    loaded = conn.execute("""
+        CREATE OR REPLACE TEMP TABLE products_incoming AS
+        SELECT
+            sku as product_sku,
+            name as product_name,
+            category as product_category,
+            unit_price,
+            is_active,
+            md5(concat_ws('|', name, category, unit_price, is_active)) AS row_hash
+        FROM raw_layer.products
+    """).fetchone()[0]
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS raw_layer.products_flat AS
+        SELECT *, DATE '-infinity' AS valid_from, DATE 'infinity' AS valid_to
+        FROM products_incoming LIMIT 0
+    """)
+
+    conn.execute("BEGIN TRANSACTION")
+    # Close the open version of every product that changed or is gone from the file
+    conn.execute("""
+        UPDATE raw_layer.products_flat f
+        SET valid_to = current_date
+        WHERE f.valid_to = 'infinity'
+          AND NOT EXISTS (
+              SELECT 1 FROM products_incoming i WHERE i.product_sku = f.product_sku AND i.row_hash = f.row_hash
+          )
+    """)
+    # Open a version for every product that is new or changed
+    conn.execute("""
+        INSERT INTO raw_layer.products_flat BY NAME
+        SELECT i.*,
+               CASE WHEN EXISTS (SELECT 1 FROM raw_layer.products_flat f WHERE f.product_sku = i.product_sku)
+                    THEN current_date ELSE DATE '-infinity' END AS valid_from,
+               DATE 'infinity' AS valid_to
+        FROM products_incoming i
+        WHERE NOT EXISTS (
+            SELECT 1 FROM raw_layer.products_flat f
+            WHERE f.product_sku = i.product_sku AND f.valid_to = 'infinity'
+        )
+    """)
+    # The lookup the report probes: active versions only, ordered by key
+    conn.execute("""
+        CREATE OR REPLACE TABLE raw_layer.active_products AS
+        SELECT product_sku, valid_from, valid_to, product_category, product_name, unit_price
+        FROM raw_layer.products_flat
+        WHERE is_active = True
+        ORDER BY product_sku, valid_from
+    """)
+    record_run(conn, "products", products_hash)
+    conn.execute("COMMIT")
+    return loaded
+
+def load_orders(conn, full=True):
+    """Loads the CSV orders into raw_layer.orders; returns the number of orders loaded.
+
+    Incrementally (full=False), only orders whose order_id is not in raw_layer.orders yet are
+    appended; they are also queued in raw_layer.orders_delta for the T phase. Changes to orders
+    already loaded are not picked up: that needs a full load, as does a warehouse with no
+    orders_delta yet (one built before orders were loaded incrementally).
+    """
+    if full or not all(table_exists(conn, "raw_layer", t) for t in ("orders", "orders_delta")):
+        loaded = conn.execute(f"""
+            CREATE OR REPLACE TABLE raw_layer.orders AS
+            SELECT * FROM read_csv_auto('{ORDERS_CSV}')
+        """).fetchone()[0]
+        # Nothing is queued: dropping the report makes the T phase rebuild it from scratch
+        conn.execute("CREATE OR REPLACE TABLE raw_layer.orders_delta AS FROM raw_layer.orders LIMIT 0")
+        conn.execute("DROP TABLE IF EXISTS analytical_layer.revenue_by_category")
+        return loaded
+
+    # Anti-join on the key: only order_ids the warehouse has not seen are inserted
+    loaded = conn.execute(f"""
+        CREATE OR REPLACE TEMP TABLE new_orders AS
+        SELECT s.* FROM read_csv_auto('{ORDERS_CSV}') s
+        ANTI JOIN raw_layer.orders o USING (order_id)
+    """).fetchone()[0]
+    conn.execute("BEGIN TRANSACTION")
+    conn.execute("INSERT INTO raw_layer.orders BY NAME FROM new_orders")
+    conn.execute("INSERT INTO raw_layer.orders_delta BY NAME FROM new_orders")
+    conn.execute("COMMIT")
+    print(f"Appended {loaded} new orders from {ORDERS_CSV} to raw_layer.orders")
+    return loaded
+
+def load_source(conn, path, loader):
+    """Runs one source's loader on its own cursor; returns (rows loaded, seconds)."""
+    cursor = conn.cursor()
     try:
-        with duckdb.connect(DB_PATH) as conn:
-            # Create a dedicated schema for raw, untransformed data
-            conn.execute("CREATE SCHEMA IF NOT EXISTS raw_layer")
+        start = time.perf_counter()
+        rows = loader(cursor)
+        return rows, time.perf_counter() - start
+    finally:
+        cursor.close()
 
-            # 1. Load CSV Orders Data (Native Ingest)
-            print(f"Loading {ORDERS_CSV} into raw_layer.orders...")
-            conn.execute(f"""
-                CREATE OR REPLACE TABLE raw_layer.orders AS
-                SELECT * FROM read_csv_auto('{ORDERS_CSV}')
-            """)
+def run_et_phase(conn, full=True):
+    """Loads raw data from CSV and JSON into the warehouse.
 
-            # 2. Load JSON Products Data (Native JSON Read)
-            # We treat the JSON file as a source table. 
-            # The 'UNNEST' function is key to flattening complex arrays in JSON.
+    Sources share no tables, so each is loaded on its own cursor, all at once; a loader returns the
+    row count of its load statement, so no count queries follow.
+    """
 
-            print(f"Loading {PRODUCTS_JSON} into raw_layer.products...")
-            conn.execute(f"""
-                CREATE OR REPLACE TABLE raw_layer.products AS
-                SELECT * FROM read_json_auto('{PRODUCTS_JSON}')
-            """)
+    print("\n--- Starting EL Phase (Extract & Load) ---")
 
-            # Now, flatten the complex JSON structure into a usable table
-            conn.execute("""
-                CREATE OR REPLACE TABLE raw_layer.products_flat AS
-                SELECT
-                    sku as product_sku,
-                    name as product_name,
-                    category as product_category,
-                    unit_price,
-                    is_active
-                FROM raw_layer.products
-            """)
+    try:
+        # Create a dedicated schema for raw, untransformed data
+        conn.execute("CREATE SCHEMA IF NOT EXISTS raw_layer")
 
-            # Verify the load count
-            order_count = conn.sql("SELECT count(order_id) FROM raw_layer.orders").fetchone()[0]
-            product_count = conn.sql("SELECT count(product_sku) FROM raw_layer.products_flat").fetchone()[0]
-            
-            print(f"✅ Loaded {order_count} orders and {product_count} products.")
-            return True
+        # source file -> loader; the JSON products reload only when their content has changed
+        loaders = {
+            ORDERS_CSV: partial(load_orders, full=full),
+            PRODUCTS_JSON: load_products,
+        }
+        with ThreadPoolExecutor(max_workers=len(loaders)) as pool:
+            futures = {path: pool.submit(load_source, conn, path, loader) for path, loader in loaders.items()}
+        for path, future in futures.items():
+            rows, seconds = future.result()
+            megabytes = os.path.getsize(path) / 1e6
+            print(f"✅ {path}: {rows} rows in {seconds:.2f}s"
+                  + (f" ({rows / seconds:,.0f} rows/s, {megabytes / seconds:.1f} MB/s)" if rows else ""))
+        return True
 
     except duckdb.Error as e:
         print(f"❌ Error during EL phase: {str(e)}")
@@ -61,42 +256,176 @@ def run_et_phase():
         print(f"❌ File I/O Error: Ensure {ORDERS_CSV} and {PRODUCTS_JSON} exist. {e}")
         return False
 
-def run_t_phase():
-    """Performs transformation and aggregation for the unified report."""
+# The report sales by product and category, over the orders in {orders} that pass {where}
+REVENUE_BY_CATEGORY = """
+    SELECT
+        p.product_category,
+        p.product_name,
+        CAST(STRFTIME(o.sale_date, '%Y-%m') AS VARCHAR) AS sales_month,
+        sum(o.quantity) as total_units_sold,
+        SUM(o.quantity * p.unit_price) as total_revenue_usd,
+        {distinct} as distinct_customers
+    FROM {orders} o
+    -- only active products, at the version valid on the sale date
+    JOIN raw_layer.active_products p
+      ON o.product_sku = p.product_sku AND o.sale_date >= p.valid_from AND o.sale_date < p.valid_to
+    WHERE {where}
+    GROUP BY p.product_category, p.product_name, sales_month
+"""
+
+# distinct_customers per --distinct mode: an exact hash set per group, or HyperLogLog
+DISTINCT_CUSTOMERS = {
+    "exact": "COUNT(DISTINCT o.customer_id)",
+    "approx": "approx_count_distinct(o.customer_id)",
+}
+
+# The same report with a customer_sketch per group. The first GROUP BY keeps one row per group and
+# sketch register, so memory is bounded by registers rather than by customers; registers no
+# customer hashed into are filled with 0 before each group's registers are listed in order.
+REVENUE_SKETCH = f"""
+    WITH ranks AS (
+        SELECT
+            p.product_category,
+            p.product_name,
+            CAST(STRFTIME(o.sale_date, '%Y-%m') AS VARCHAR) AS sales_month,
+            hll_bucket(hash(o.customer_id)) AS bucket,
+            max(hll_rank(hash(o.customer_id))) AS rank,
+            sum(o.quantity) AS units,
+            SUM(o.quantity * p.unit_price) AS revenue
+        FROM {{orders}} o
+        JOIN raw_layer.active_products p
+          ON o.product_sku = p.product_sku AND o.sale_date >= p.valid_from AND o.sale_date < p.valid_to
+        GROUP BY ALL
+    ), sketches AS (
+        SELECT
+            product_category,
+            product_name,
+            sales_month,
+            sum(units) as total_units_sold,
+            SUM(revenue) as total_revenue_usd,
+            list(rank ORDER BY bucket) as customer_sketch
+        FROM (
+            FROM ranks
+            UNION ALL BY NAME
+            SELECT g.*, b.range::UBIGINT AS bucket, 0::UTINYINT AS rank
+            FROM (SELECT DISTINCT product_category, product_name, sales_month FROM ranks) g
+            CROSS JOIN range({REGISTERS}) b
+            ANTI JOIN ranks r
+              ON r.product_category = g.product_category AND r.product_name = g.product_name
+             AND r.sales_month = g.sales_month AND r.bucket = b.range
+        )
+        GROUP BY product_category, product_name, sales_month
+    )
+    SELECT * EXCLUDE (customer_sketch), hll_estimate(customer_sketch) as distinct_customers, customer_sketch
+    FROM sketches
+"""
+
+def run_t_phase(conn, full=True, distinct="exact"):
+    """Performs transformation and aggregation for the unified report.
+
+    Incrementally (full=False), only the (category, product, month) groups that the orders queued in
+    raw_layer.orders_delta fall into are updated. With distinct="sketch", the queued orders are
+    aggregated on their own and merged into the stored totals and customer sketches; otherwise
+    distinct_customers does not add up across loads, so a touched group is recomputed from all of its orders.
+    """
 
     print("\n--- Starting T Phase (Transform) ---")
 
     try:
-        with duckdb.connect(DB_PATH) as conn:
-            conn.execute("CREATE SCHEMA IF NOT EXISTS analytical_layer")
+        conn.execute("CREATE SCHEMA IF NOT EXISTS analytical_layer")
 
-            # The transformation query for the report sales by product and category
-            transformation_query = """
-                -- Create the final report table for the business users
+        if distinct == "sketch":
+            report = REVENUE_SKETCH.format
+        else:
+            report = partial(REVENUE_BY_CATEGORY.format, distinct=DISTINCT_CUSTOMERS[distinct])
+
+        if full or not table_exists(conn, "analytical_layer", "revenue_by_category"):
+            # Create the final report table for the business users
+            conn.execute(f"""
                 CREATE OR REPLACE TABLE analytical_layer.revenue_by_category AS
-                SELECT
-                    p.product_category,
-                    p.product_name,
-                    CAST(STRFTIME(o.sale_date, '%Y-%m') AS VARCHAR) AS sales_month,
-                    sum(o.quantity) as total_units_sold,
-                    SUM(o.quantity * p.unit_price) as total_revenue_usd,
-                    COUNT(DISTINCT o.customer_id) as distinct_customers
-                FROM raw_layer.orders o
-                JOIN raw_layer.products_flat p ON o.product_sku = p.product_sku
-                WHERE p.is_active = True -- only consider active products
-                GROUP BY p.product_category, p.product_name, sales_month
-                ORDER BY total_revenue_usd DESC;
-            """
-
-            conn.execute(transformation_query)
-            print("✅ Transformation completed successfully.")
-
-            # Display the final report
-            print("\n--- Final UrbanCycle Revenue Report ---")
-            result_df = conn.sql("SELECT * FROM analytical_layer.revenue_by_category").df()
-            print(result_df.to_markdown(index=False))
-
-            return True
+                {report(orders="raw_layer.orders", where="True")}
+            """)
+            conn.execute("DELETE FROM raw_layer.orders_delta")
+        elif distinct == "sketch":
+            # Only the queued orders are read: sums add up and sketches merge
+            conn.execute("BEGIN TRANSACTION")
+            conn.execute(f"""
+                MERGE INTO analytical_layer.revenue_by_category AS r
+                USING ({report(orders="raw_layer.orders_delta")}) AS changed
+                USING (product_category, product_name, sales_month)
+                WHEN MATCHED THEN UPDATE SET
+                    total_units_sold = r.total_units_sold + changed.total_units_sold,
+                    total_revenue_usd = r.total_revenue_usd + changed.total_revenue_usd,
+                    distinct_customers = hll_estimate(hll_merge(r.customer_sketch, changed.customer_sketch)),
+                    customer_sketch = hll_merge(r.customer_sketch, changed.customer_sketch)
+                WHEN NOT MATCHED THEN INSERT
+            """)
+            merged = conn.sql("SELECT count(*) FROM raw_layer.orders_delta").fetchone()[0]
+            conn.execute("DELETE FROM raw_layer.orders_delta")
+            conn.execute("COMMIT")
+            print(f"Merged the sketches and totals of {merged} new orders")
+        else:
+            # The groups the new orders fall into
+            conn.execute("""
+                CREATE OR REPLACE TEMP TABLE affected AS
+                SELECT DISTINCT p.product_category, p.product_name, STRFTIME(o.sale_date, '%Y-%m') AS sales_month
+                FROM raw_layer.orders_delta o
+                JOIN raw_layer.active_products p
+                  ON o.product_sku = p.product_sku AND o.sale_date >= p.valid_from AND o.sale_date < p.valid_to
+            """)
+            conn.execute("BEGIN TRANSACTION")
+            conn.execute(f"""
+                MERGE INTO analytical_layer.revenue_by_category
+                USING ({report(
+                    orders="raw_layer.orders",
+                    # The month bound lets zone maps skip older orders
+                    where="""o.sale_date >= (SELECT date_trunc('month', min(sale_date)) FROM raw_layer.orders_delta)
+                      AND EXISTS (
+                          SELECT 1 FROM affected a
+                          WHERE a.product_category = p.product_category AND a.product_name = p.product_name
+                            AND a.sales_month = STRFTIME(o.sale_date, '%Y-%m')
+                      )""",
+                )}) AS changed
+                USING (product_category, product_name, sales_month)
+                WHEN MATCHED THEN UPDATE
+                WHEN NOT MATCHED THEN INSERT
+            """)
+            conn.execute("DELETE FROM raw_layer.orders_delta")
+            conn.execute("COMMIT")
+            groups = conn.sql("SELECT count(*) FROM affected").fetchone()[0]
+            print(f"Merged {groups} recomputed (category, product, month) groups")
+
+        if distinct == "sketch":
+            # Sketches merge across months too: distinct customers per product over all of them
+            conn.execute("""
+                CREATE OR REPLACE VIEW analytical_layer.customers_by_product AS
+                SELECT product_category, product_name, hll_estimate(list(register ORDER BY i)) AS distinct_customers
+                FROM (
+                    SELECT product_category, product_name, i, max(register) AS register
+                    FROM (
+                        SELECT product_category, product_name,
+                               unnest(customer_sketch) AS register, generate_subscripts(customer_sketch, 1) AS i
+                        FROM analytical_layer.revenue_by_category
+                    )
+                    GROUP BY ALL
+                )
+                GROUP BY ALL
+            """)
+        print("✅ Transformation completed successfully.")
+
+        # Display the final report
+        print("\n--- Final UrbanCycle Revenue Report ---")
+        # Rows come straight off DuckDB's Arrow record batches instead of a pandas copy of the table
+        result = conn.execute("""
+            SELECT COLUMNS(c -> c <> 'customer_sketch') FROM analytical_layer.revenue_by_category
+            ORDER BY total_revenue_usd DESC
+        """)
+        # to_arrow_reader() is fetch_record_batch() from DuckDB 1.5 on
+        reader = getattr(result, "to_arrow_reader", result.fetch_record_batch)(REPORT_BATCH_ROWS)
+        rows = (row.values() for batch in reader for row in batch.to_pylist())
+        print(tabulate(rows, headers=reader.schema.names, tablefmt="pipe"))
+
+        return True
 
     except duckdb.Error as e:
         print(f"❌ Error during T phase: {str(e)}")
@@ -104,10 +433,29 @@ def run_t_phase():
 
 
 if __name__ == "__main__":
-    if run_et_phase():
-        if run_t_phase():
-            print("\n--- ETL Process Completed Successfully ---")
+    parser = argparse.ArgumentParser(description="Load UrbanCycle orders and products, then build the revenue report")
+    parser.add_argument("--full", action="store_true",
+                        help="reload every order and rebuild the report instead of loading only new order_ids")
+    parser.add_argument("--distinct", choices=[*DISTINCT_CUSTOMERS, "sketch"], default="exact",
+                        help="distinct_customers as COUNT(DISTINCT), approx_count_distinct, or from stored "
+                             "HyperLogLog sketches that later loads merge into")
+    args = parser.parse_args()
+
+    # Use 'with' for safe connection management
+    with get_connection() as conn:
+        # The warehouse file persists, so a phase whose inputs have not changed is not rerun
+        # The orders CSV is too big to hash on every run; the products JSON is hashed, as load_products does
+        el = phase_fingerprint(run_et_phase, ORDERS_CSV, contents=[PRODUCTS_JSON])
+        t = phase_fingerprint(run_t_phase, upstream=el + args.distinct)
+        # Merging into the report is only valid while products, the report query and its
+        # distinct mode are unchanged
+        report = phase_fingerprint(run_t_phase, upstream=args.distinct, contents=[PRODUCTS_JSON])
+        if run_phase(conn, "EL", partial(run_et_phase, full=args.full), el, force=args.full):
+            full = args.full or not is_unchanged(conn, "report", report)
+            if run_phase(conn, "T", partial(run_t_phase, full=full, distinct=args.distinct), t, force=args.full):
+                record_run(conn, "report", report)
+                print("\n--- ETL Process Completed Successfully ---")
+            else:
+                print("\n--- ETL Process Failed ---")
         else:
             print("\n--- ETL Process Failed ---")
-    else:
-        print("\n--- ETL Process Failed ---")
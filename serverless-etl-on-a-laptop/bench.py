@@ -0,0 +1,165 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+import duckdb as dd
+from connection import get_connection, SETTINGS
+
+BENCH = Path("data/bench")  # one generated dataset per scale factor, plus the reports
+HERE = Path(__file__).parent
+
+SCALES = (1, 10)  # x the generator's default orders per day; 100 is a load test
+WARMUP = 1
+ITERATIONS = 5
+SEED = 42
+
+# Storage formats each dataset is rewritten in, one output file per raw daily file
+FORMATS = {
+    "csv": "FORMAT CSV, HEADER TRUE",
+    "parquet_uncompressed": "FORMAT PARQUET, COMPRESSION UNCOMPRESSED",
+    "parquet_snappy": "FORMAT PARQUET, COMPRESSION SNAPPY",
+    "parquet_zstd1": "FORMAT PARQUET, COMPRESSION ZSTD, COMPRESSION_LEVEL 1",
+    "parquet_zstd3": "FORMAT PARQUET, COMPRESSION ZSTD, COMPRESSION_LEVEL 3",
+    "parquet_zstd9": "FORMAT PARQUET, COMPRESSION ZSTD, COMPRESSION_LEVEL 9",
+}
+
+# The measure_read.py scenarios; {orders} is the scan of one format, {dim} the customer dimension
+SCENARIOS = {
+    "full_count": "SELECT count(*) FROM {orders}",
+    "filtered_count": "SELECT count(*) FROM {orders} WHERE ds >= DATE '2025-10-20'",
+    "daily_aggregates": """
+        SELECT count(*) FROM (
+            SELECT customer_id, ds, COUNT(*) AS orders, SUM(total) AS gross, AVG(total) AS avg_ticket
+            FROM {orders}
+            GROUP BY ALL
+        )
+    """,
+    "big_to_small_join": """
+        SELECT count(*) FROM (
+            SELECT f.ds, f.customer_id, d.segment, SUM(f.total) AS gross
+            FROM {orders} f
+            JOIN {dim} d USING (customer_id)
+            WHERE f.ds BETWEEN DATE '2025-10-01' AND DATE '2025-10-15'
+            GROUP BY ALL
+        )
+    """,
+}
+
+def generate(scale):
+    """The generators' own CLIs, run inside data/bench/sf{scale} so their data/ paths land there"""
+    root = BENCH / f"sf{scale}"
+    if not (root / "data" / "dim_customer.parquet").exists() or not list((root / "data" / "raw").glob("*.parquet")):
+        root.mkdir(parents=True, exist_ok=True)
+        # The dimension stays the same size: orders draw from a fixed customer_id range
+        subprocess.run([sys.executable, HERE / "generate_customer_dimension.py", "--seed", str(SEED)],
+                       cwd=root, check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([sys.executable, HERE / "generate_orders_data.py", "--seed", str(SEED),
+                        "--orders-min", str(200 * scale), "--orders-max", str(500 * scale)],
+                       cwd=root, check=True, stdout=subprocess.DEVNULL)
+    return root
+
+def write_formats(con, root):
+    """Rewrite the raw files in every format; returns {format: (seconds to write, bytes on disk)}"""
+    written = {}
+    for name, options in FORMATS.items():
+        dest = root / name
+        ext = "csv" if name == "csv" else "parquet"
+        if not (dest / "write_seconds").exists():
+            # Written next to dest and renamed into place once complete, so an interrupted run leaves
+            # no half-written format behind (a dest without write_seconds is one, from before)
+            tmp = root / f"{name}.tmp"
+            shutil.rmtree(tmp, ignore_errors=True)
+            shutil.rmtree(dest, ignore_errors=True)
+            tmp.mkdir()
+            t0 = time.perf_counter()
+            for src in sorted((root / "data" / "raw").glob("*.parquet")):
+                con.execute(f"COPY (SELECT * FROM read_parquet('{src}')) TO '{tmp / f'{src.stem}.{ext}'}' ({options})")
+            (tmp / "write_seconds").write_text(str(time.perf_counter() - t0))
+            tmp.rename(dest)
+        size = sum(f.stat().st_size for f in dest.glob(f"*.{ext}"))
+        written[name] = (float((dest / "write_seconds").read_text()), size)
+    return written
+
+def scan(root, name):
+    if name == "csv":
+        return f"read_csv('{root / name / '*.csv'}')"
+    return f"read_parquet('{root / name / '*.parquet'}')"
+
+def measure(task):
+    """Run one scenario WARMUP + iterations times in this (fresh) process"""
+    sql, warmup, iterations = task
+    con = get_connection()
+    for _ in range(warmup):
+        con.execute(sql).fetchall()
+    timings = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        con.execute(sql).fetchall()
+        timings.append(time.perf_counter() - t0)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return timings, peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+def p95(timings):
+    return statistics.quantiles(timings, n=20, method="inclusive")[18] if len(timings) > 1 else timings[0]
+
+def main(scales=SCALES, formats=tuple(FORMATS), scenarios=tuple(SCENARIOS), warmup=WARMUP, iterations=ITERATIONS):
+    con = get_connection()
+    results = []
+    # A fresh process per measurement: peak RSS is then the scenario's own, not the run's
+    spawn = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=spawn, max_tasks_per_child=1) as pool:
+        for scale in scales:
+            root = generate(scale)
+            written = write_formats(con, root)
+            rows = con.execute(f"SELECT count(*) FROM {scan(root, 'parquet_zstd3')}").fetchone()[0]
+            dim = f"read_parquet('{root / 'data' / 'dim_customer.parquet'}')"
+            for fmt in formats:
+                for scenario in scenarios:
+                    sql = SCENARIOS[scenario].format(orders=scan(root, fmt), dim=dim)
+                    timings, peak_rss_mb = pool.submit(measure, (sql, warmup, iterations)).result()
+                    results.append({
+                        "scale": scale, "rows": rows, "format": fmt, "scenario": scenario,
+                        "iterations": iterations, "median_seconds": statistics.median(timings),
+                        "p95_seconds": p95(timings), "min_seconds": min(timings),
+                        "peak_rss_mb": peak_rss_mb, "bytes_on_disk": written[fmt][1],
+                        "write_seconds": written[fmt][0], "timings": timings,
+                    })
+                    r = results[-1]
+                    print(f"sf{scale:<4} {fmt:<22} {scenario:<18} median {r['median_seconds']:.4f}s "
+                          f"p95 {r['p95_seconds']:.4f}s  {r['peak_rss_mb']:.0f} MB  "
+                          f"{r['bytes_on_disk'] / 1e6:.1f} MB on disk")
+
+    report = {
+        "duckdb_version": dd.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "settings": SETTINGS,
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "warmup": warmup,
+        "results": results,
+    }
+    path = BENCH / f"report_{dd.__version__}_{datetime.now():%Y%m%dT%H%M%S}.json"
+    path.write_text(json.dumps(report, indent=2))
+    print(f"OK → {path}")
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the measure_read.py scenarios across scales and formats")
+    parser.add_argument("--scales", default=",".join(map(str, SCALES)), help="comma-separated scale factors, e.g. 1,10,100")
+    parser.add_argument("--formats", default=",".join(FORMATS), help=f"subset of {', '.join(FORMATS)}")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"subset of {', '.join(SCENARIOS)}")
+    parser.add_argument("--warmup", type=int, default=WARMUP)
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    args = parser.parse_args()
+    main(tuple(int(s) for s in args.scales.split(",")), tuple(args.formats.split(",")),
+         tuple(args.scenarios.split(",")), args.warmup, args.iterations)
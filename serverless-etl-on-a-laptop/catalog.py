@@ -0,0 +1,92 @@
+import re
+from datetime import date, datetime
+from pathlib import Path
+from manifest import fingerprint, file_list
+from connection import get_connection
+
+CATALOG = Path("data/catalog/file_stats.parquet")
+RAW_GLOB = "data/raw/orders_*.parquet"
+
+# Python type of the predicate bound -> DuckDB type the footer strings are cast to
+BOUND_TYPES = {date: "DATE", datetime: "TIMESTAMP", int: "BIGINT", float: "DOUBLE", str: "VARCHAR"}
+
+def refresh(con, pattern, catalog=CATALOG):
+    """Harvest per-row-group min/max/null counts from the footers of new or changed files"""
+    files = sorted(Path().glob(pattern))
+    current = {str(f): fingerprint(f) for f in files}
+
+    known = {}
+    if catalog.exists():
+        con.execute(f"CREATE OR REPLACE TEMP TABLE file_stats AS SELECT * FROM read_parquet('{catalog}')")
+        known = {
+            file: {"size": size, "mtime": mtime}
+            for file, size, mtime in con.execute("SELECT DISTINCT file, size, mtime FROM file_stats").fetchall()
+        }
+        # Drop entries for files that are gone or have been rewritten
+        stale = [file for file, seen in known.items() if current.get(file) != seen]
+        if stale:
+            con.execute(f"DELETE FROM file_stats WHERE file IN (SELECT unnest({file_list(stale)}))")
+    else:
+        con.execute("""
+            CREATE OR REPLACE TEMP TABLE file_stats (
+                file VARCHAR, size BIGINT, mtime BIGINT, row_group_id BIGINT, rows BIGINT,
+                column_name VARCHAR, min_value VARCHAR, max_value VARCHAR, null_count BIGINT
+            )
+        """)
+
+    harvest = [file for file, seen in current.items() if known.get(file) != seen]
+    if harvest:
+        con.execute("CREATE OR REPLACE TEMP TABLE fingerprints (file VARCHAR, size BIGINT, mtime BIGINT)")
+        con.executemany(
+            "INSERT INTO fingerprints VALUES (?, ?, ?)",
+            [(file, current[file]["size"], current[file]["mtime"]) for file in harvest],
+        )
+        con.execute(f"""
+            INSERT INTO file_stats
+            SELECT m.file_name, f.size, f.mtime, m.row_group_id, m.row_group_num_rows,
+                   m.path_in_schema, m.stats_min_value, m.stats_max_value, m.stats_null_count
+            FROM parquet_metadata({file_list(harvest)}) m
+            JOIN fingerprints f ON f.file = m.file_name
+        """)
+
+    if harvest or len(known) != len(current):
+        catalog.parent.mkdir(parents=True, exist_ok=True)
+        tmp = catalog.with_suffix(".tmp")
+        con.execute(f"COPY (SELECT * FROM file_stats ORDER BY file, column_name, row_group_id) TO '{tmp}' (FORMAT PARQUET)")
+        tmp.replace(catalog)
+    return len(harvest)
+
+def catalog_for(pattern):
+    """CATALOG for the raw orders, a catalog of its own for any other dataset: refresh() drops the
+    entries of files pattern does not match"""
+    return CATALOG if pattern == RAW_GLOB else CATALOG.with_name(f"file_stats_{re.sub(r'\W+', '_', pattern)}.parquet")
+
+def files_between(con, pattern, column, lo, hi, catalog=CATALOG):
+    """Files whose [min, max] for column overlaps [lo, hi]; only footers are consulted"""
+    refresh(con, pattern, catalog)
+    sql_type = BOUND_TYPES[type(lo)]
+    rows = con.execute(f"""
+        SELECT file
+        FROM file_stats
+        WHERE column_name = $column
+        GROUP BY file
+        HAVING MIN(TRY_CAST(min_value AS {sql_type})) <= $hi::{sql_type}
+           AND MAX(TRY_CAST(max_value AS {sql_type})) >= $lo::{sql_type}
+        ORDER BY file
+    """, {"column": column, "lo": lo, "hi": hi}).fetchall()
+    return [file for (file,) in rows]
+
+def pruned_scan(con, pattern, column, lo, hi, catalog=CATALOG):
+    """read_parquet(...) over only the files that can hold rows with lo <= column <= hi"""
+    files = files_between(con, pattern, column, lo, hi, catalog)
+    if not files:
+        # Keep the schema so the surrounding query still binds
+        return f"(SELECT * FROM read_parquet('{pattern}') LIMIT 0)"
+    return f"read_parquet({file_list(files)})"
+
+if __name__ == "__main__":
+    con = get_connection()
+    harvested = refresh(con, RAW_GLOB)
+    print(f"OK → {CATALOG} ({harvested} files harvested)")
+    week = files_between(con, RAW_GLOB, "ds", date(2025, 10, 1), date(2025, 10, 7))
+    print(f"ds 2025-10-01..2025-10-07 → {len(week)} files")
@@ -0,0 +1,50 @@
+# A check is a name and a SQL predicate that holds for a bad row. check_columns() turns a table's
+# checks into count(*) FILTER columns, so the GROUP BY that builds the published aggregate counts
+# violations in the same scan; check_results() then sums them from that (small) aggregate.
+
+def sql_literal(value):
+    return "'" + value.replace("'", "''") + "'" if isinstance(value, str) else str(value)
+
+def not_null(column):
+    return f"{column} IS NULL"
+
+def non_negative(column):
+    return f"{column} < 0"
+
+def in_range(column, lo, hi):
+    return f"{column} NOT BETWEEN {sql_literal(lo)} AND {sql_literal(hi)}"
+
+def one_of(column, values):
+    return f"{column} NOT IN ({', '.join(sql_literal(v) for v in values)})"
+
+ORDERS_CLEAN = {
+    "null_ds": not_null("ds"),
+    "neg_totals": non_negative("total"),
+    "bad_status": one_of("order_status", ("shipped", "pending", "cancelled", "other")),
+}
+
+LIFE_EXPECTANCY_CLEAN = {
+    "invalid_life_expectancy": in_range("life_expectancy", 0, 120),
+    "invalid_years": in_range("year", 1800, 2100),
+    "invalid_status": one_of("status", ("Developed", "Developing")),
+}
+
+def check_columns(checks):
+    """SELECT-list entries counting rows and each check's violations, for a GROUP BY query"""
+    counts = [f"count(*) FILTER (WHERE {predicate}) AS __check_{name}" for name, predicate in checks.items()]
+    return ", ".join(["count(*) AS __check_rows", *counts])
+
+def check_names(checks):
+    """The columns check_columns() adds, e.g. for SELECT * EXCLUDE (...)"""
+    return ", ".join(f"__check_{name}" for name in ["rows", *checks])
+
+def check_results(con, table, checks):
+    """{"rows": n, check: violations, ...} summed over an aggregate built with check_columns()"""
+    sums = ", ".join(f"coalesce(sum(__check_{name}), 0)::BIGINT" for name in ["rows", *checks])
+    values = con.execute(f"SELECT {sums} FROM {table}").fetchone()
+    return dict(zip(["rows", *checks], values))
+
+def assert_checks(table, results):
+    failed = {name: count for name, count in results.items() if name != "rows" and count}
+    assert not failed, f"{table}: checks failed on {results['rows']} rows: {failed}"
+    print(f"✓ {table}: {len(results) - 1} checks passed on {results['rows']} rows")
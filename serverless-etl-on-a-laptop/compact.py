@@ -0,0 +1,148 @@
+import argparse
+import fnmatch
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from manifest import file_list, save_manifest
+from measure_read import run, filtered_count, FILTER_FROM
+from connection import get_connection
+
+STAGE = Path("data/stage/compaction")  # same filesystem as data/, so swaps are renames
+JOURNAL = STAGE / "swap.json"  # the swap in progress, finished by the next run if this one crashes
+
+TARGET_MB = 128
+ROW_GROUP_SIZE = 122880  # DuckDB's default, spelled out so it can be tuned per dataset
+
+def write_compacted(con, files, dest, name, sort_by, target_mb, row_group_size):
+    """Rewrite files as target-sized Parquet files named {name}_{i}.parquet under dest"""
+    order = f"ORDER BY {sort_by}" if sort_by else ""
+    con.execute(f"""
+        COPY (
+            SELECT * FROM read_parquet({file_list(files)}, hive_partitioning = false)
+            {order}
+        ) TO '{dest}' (
+            FORMAT PARQUET, COMPRESSION ZSTD,
+            ROW_GROUP_SIZE {row_group_size},
+            FILE_SIZE_BYTES '{target_mb}MB',
+            FILENAME_PATTERN '{name}_{{i}}',
+            OVERWRITE_OR_IGNORE
+        )
+    """)
+
+def swap_in(staged, target, replaced):
+    """Move the files staged for target into it, then delete the files they replace.
+
+    Each move is one os.replace, so target and every file in it exist throughout. The swap is
+    journaled before anything moves: until it is finished the merged rows can be there twice, never
+    missing, and finish_swap() completes it from the journal if this run dies halfway.
+    """
+    names = sorted(f.name for f in staged.iterdir())
+    save_manifest(JOURNAL, {
+        "staged": str(staged),
+        "target": str(target),
+        "add": names,
+        "remove": sorted(str(f) for f in replaced if f.name not in names),
+    })
+    finish_swap()
+
+def finish_swap():
+    """Complete the journaled swap, if any: move in what is still staged, then delete the replaced files"""
+    if not JOURNAL.exists():
+        return
+    swap = json.loads(JOURNAL.read_text())
+    staged, target = Path(swap["staged"]), Path(swap["target"])
+    for name in swap["add"]:
+        if (staged / name).exists():
+            os.replace(staged / name, target / name)
+    for path in swap["remove"]:
+        Path(path).unlink(missing_ok=True)
+    shutil.rmtree(staged, ignore_errors=True)
+    JOURNAL.unlink()
+
+def compact_partitions(con, root, sort_by, target_mb, row_group_size):
+    """Hive layout: merge the files inside every key=value partition that holds more than one"""
+    compacted = 0
+    for partition in sorted(p for p in root.iterdir() if p.is_dir() and "=" in p.name):
+        files = sorted(partition.glob("*.parquet"))
+        if len(files) < 2:
+            continue
+        staged = STAGE / partition.name
+        shutil.rmtree(staged, ignore_errors=True)
+        STAGE.mkdir(parents=True, exist_ok=True)
+        write_compacted(con, files, staged, "data", sort_by, target_mb, row_group_size)
+        swap_in(staged, partition, files)
+        compacted += 1
+    return compacted
+
+def compact_flat(con, root, pattern, group_regex, sort_by, target_mb, row_group_size):
+    """Flat layout: merge files whose names share the regex group (e.g. a month) into one set each.
+
+    Output is named after the inputs: their name up to the group, then the group, e.g.
+    orders_2025-10-0{1,2}.parquet → orders_2025-10_0.parquet, so the globs that read the inputs
+    read the output too.
+    """
+    groups = {}
+    for f in sorted(root.glob(pattern)):
+        match = re.match(group_regex, f.name)
+        if match:
+            name = f.name[:match.start(1)] + match.group(1)
+            groups.setdefault(name, []).append(f)
+    groups = {name: files for name, files in groups.items() if len(files) > 1}
+    for name in groups:
+        if not fnmatch.fnmatch(f"{name}_0.parquet", pattern):
+            raise ValueError(f"Compacted file {name}_0.parquet would not match --pattern {pattern}")
+    if not groups:
+        return 0
+
+    staged = STAGE / root.name
+    shutil.rmtree(staged, ignore_errors=True)
+    staged.mkdir(parents=True)
+    for name, files in groups.items():
+        write_compacted(con, files, staged, name, sort_by, target_mb, row_group_size)
+    swap_in(staged, root, [f for files in groups.values() for f in files])
+    return len(groups)
+
+def scan_times(glob, hive):
+    """The measure_read.py count queries against the dataset"""
+    full, _ = run(f"SELECT count(*) FROM read_parquet('{glob}')")
+    if hive:
+        # ds is a partition key, not in the footers: DuckDB prunes the directories itself
+        filtered, _ = run(f"SELECT count(*) FROM read_parquet('{glob}') WHERE ds >= '{FILTER_FROM}'")
+    else:
+        filtered, _ = filtered_count(glob)
+    return full, filtered, len(list(Path().glob(glob)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge small Parquet files into right-sized ones")
+    parser.add_argument("root", type=Path, help="dataset directory, e.g. data/raw or data/features/customer_daily")
+    parser.add_argument("--pattern", default="*.parquet", help="flat layout: files to consider")
+    parser.add_argument("--group-regex", help=r"flat layout: regex whose group 1 names the output, e.g. 'orders_(\d{4}-\d{2})'")
+    parser.add_argument("--sort-by", default="", help="ORDER BY expression for the rewritten files")
+    parser.add_argument("--target-mb", type=int, default=TARGET_MB)
+    parser.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    finish_swap()  # a swap an earlier run did not get to finish
+    hive = any(p.is_dir() and "=" in p.name for p in args.root.iterdir())
+    glob = str(args.root / ("*/*.parquet" if hive else args.pattern))
+    before = scan_times(glob, hive)
+
+    con = get_connection()
+    if hive:
+        compacted = compact_partitions(con, args.root, args.sort_by, args.target_mb, args.row_group_size)
+    else:
+        if not args.group_regex:
+            parser.error("--group-regex is required for a flat directory")
+        compacted = compact_flat(con, args.root, args.pattern, args.group_regex,
+                                 args.sort_by, args.target_mb, args.row_group_size)
+
+    after = scan_times(glob, hive)
+    print(f"OK → compacted {compacted} partitions under {args.root}")
+    print(f"files:          {before[2]} → {after[2]}")
+    print(f"full count:     {before[0]:.3f}s → {after[0]:.3f}s")
+    print(f"filtered count: {before[1]:.3f}s → {after[1]:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import duckdb as dd, os
+from pathlib import Path
+from manifest import fingerprint
+from enums import create_enums, replace_enums
+
+# Opt-in persistent database, e.g. ETL_DATABASE=data/warehouse.duckdb; in-memory by default
+DATABASE = os.environ.get("ETL_DATABASE", ":memory:")
+
+# Physical memory of this machine, in MB
+RAM_MB = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") // 1024 ** 2
+
+# Execution profile, e.g. ETL_PROFILE=bounded on an 8 GB runner
+PROFILES = {
+    "default": {
+        "settings": {
+            "threads": os.cpu_count(),
+            "memory_limit": "4GB",
+            "temp_directory": "data/stage/tmp",
+            "parquet_metadata_cache": True,  # footers are parsed once per process, not once per query
+        },
+        "materialize": True,
+    },
+    # Sized for raw drops larger than RAM: joins, aggregates and sorts spill to temp_directory once
+    # they reach memory_limit, fewer threads means fewer per-thread buffers, and stages are views so
+    # rows stream from the source files instead of being held in memory between stages
+    "bounded": {
+        "settings": {
+            "threads": min(os.cpu_count(), 4),
+            # A quarter of RAM, and never more than the default profile's 4GB: leaves room for Python,
+            # Arrow and whatever else the runner is doing
+            "memory_limit": os.environ.get("ETL_MEMORY_LIMIT", f"{min(RAM_MB // 4, 3 * 1024)}MB"),
+            "temp_directory": "data/stage/tmp",
+            "max_temp_directory_size": "100GB",
+            "preserve_insertion_order": False,
+            "parquet_metadata_cache": True,
+        },
+        "materialize": False,
+    },
+}
+PROFILE = os.environ.get("ETL_PROFILE", "default")
+SETTINGS = PROFILES[PROFILE]["settings"]
+
+_connections = {}
+
+def get_connection(database=None):
+    """The process-wide connection for database, created and configured on first use"""
+    database = database or DATABASE
+    if database not in _connections:
+        if database != ":memory:":
+            Path(database).parent.mkdir(parents=True, exist_ok=True)
+        con = dd.connect(database=database, read_only=False)
+        for name, value in SETTINGS.items():
+            con.execute(f"SET {name} = '{value}'")
+        create_enums(con)
+        _connections[database] = con
+    return _connections[database]
+
+def close_connections():
+    for con in _connections.values():
+        con.close()
+    _connections.clear()
+
+def load_table(con, name, parquet_file):
+    """Materialize a Parquet file as a table, reloading only when the file has changed.
+
+    In a persistent database the table survives between runs, so a dimension like
+    dim_customer is read from Parquet once rather than on every job. Columns listed for the
+    table in enums.COLUMNS are loaded as ENUMs.
+    """
+    con.execute("CREATE TABLE IF NOT EXISTS loaded_files (name VARCHAR PRIMARY KEY, size BIGINT, mtime BIGINT)")
+    current = fingerprint(Path(parquet_file))
+    seen = con.execute("SELECT size, mtime FROM loaded_files WHERE name = ?", [name]).fetchone()
+    exists = con.execute("SELECT count(*) FROM duckdb_tables() WHERE table_name = ?", [name]).fetchone()[0]
+    if not exists or seen != (current["size"], current["mtime"]):
+        con.execute(f"CREATE OR REPLACE TABLE {name} AS SELECT {replace_enums(name)} FROM read_parquet('{parquet_file}')")
+        con.execute("INSERT OR REPLACE INTO loaded_files VALUES (?, ?, ?)", [name, current["size"], current["mtime"]])
+    return name
+
+def create_stage(con, name, select_sql):
+    """A pipeline stage: a table under the default profile, a view under bounded.
+
+    A view is recomputed from its source by every query that reads it, trading repeat
+    scans for never holding the stage in memory.
+    """
+    kind = "TABLE" if PROFILES[PROFILE]["materialize"] else "VIEW"
+    con.execute(f"CREATE OR REPLACE {kind} {name} AS {select_sql}")
+    return name
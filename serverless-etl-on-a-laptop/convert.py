@@ -0,0 +1,142 @@
+import hashlib, json, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from layout import apply_layout
+from manifest import fingerprint, save_manifest
+from connection import get_connection
+
+STATE = Path("data/stage/convert")
+SCHEMAS = STATE / "schemas.json"      # sniffed CSV dialect + columns per source glob and header line
+CONVERTED = STATE / "converted.json"  # source -> fingerprint and outputs of its last conversion
+
+WORKERS = 4  # files converted at once; DuckDB's thread budget is shared by all of them
+
+def load_json(path):
+    return json.loads(path.read_text()) if path.exists() else {}
+
+def sql_str(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+def header_hash(path):
+    """Hash of a file's first line: files of one glob that share it share their dialect and columns"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.readline()).hexdigest()[:16]
+
+def sniffed_schema(con, pattern, src):
+    """CSV dialect and column types for src, sniffed once per source glob and header line and cached.
+
+    A file whose header (or delimiter) differs from the files before it gets its own entry rather
+    than being read with their columns.
+    """
+    schemas = load_json(SCHEMAS)
+    key = f"{pattern}#{header_hash(src)}"
+    if key not in schemas:
+        delim, header, columns, date_format = con.execute(
+            "SELECT Delimiter, HasHeader, Columns, DateFormat FROM sniff_csv(?)", [str(src)]
+        ).fetchone()
+        schemas[key] = {
+            "delim": delim,
+            "header": header,
+            "columns": [[c["name"], c["type"]] for c in columns],  # a list: file order matters
+            "dateformat": date_format,
+        }
+        STATE.mkdir(parents=True, exist_ok=True)
+        save_manifest(SCHEMAS, schemas)
+    return schemas[key]
+
+def read_csv_sql(path, schema):
+    """read_csv with the cached schema, so no file is sniffed again"""
+    columns = ", ".join(f"{sql_str(name)}: {sql_str(kind)}" for name, kind in schema["columns"])
+    options = f", dateformat = {sql_str(schema['dateformat'])}" if schema["dateformat"] else ""
+    return (f"read_csv({sql_str(path)}, auto_detect = false, header = {schema['header']}, "
+            f"delim = {sql_str(schema['delim'])}, columns = {{{columns}}}{options})")
+
+def output_glob(to, partition_by):
+    """The files convert() writes into dest_dir"""
+    return "*.csv" if to == "csv" else "*/*.parquet" if partition_by else "*.parquet"
+
+def convert_file(con, src, dest_dir, schema, to, extra_columns, partition_by, layout):
+    """Convert one file on its own cursor; returns the files written, as COPY reports them"""
+    cur = con.cursor()
+    try:
+        if to == "csv":
+            dest = dest_dir / f"{src.stem}.csv"
+            return cur.execute(f"""
+                COPY (SELECT * FROM read_parquet({sql_str(src)}))
+                TO {sql_str(dest)} (FORMAT CSV, HEADER TRUE, RETURN_FILES true)
+            """).fetchone()[1]
+
+        extra = f", {extra_columns}" if extra_columns else ""
+        query, options = apply_layout(f"SELECT *{extra} FROM {read_csv_sql(src, schema)}", layout)
+        if partition_by:
+            # Every source writes {stem}_N.parquet into the shared partition directories
+            return sorted(cur.execute(f"""
+                COPY ({query}) TO {sql_str(dest_dir)} (
+                    FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY ({partition_by}),
+                    FILENAME_PATTERN {sql_str(src.stem + '_{i}')}, OVERWRITE_OR_IGNORE,
+                    RETURN_FILES true{options}
+                )
+            """).fetchone()[1])
+
+        dest = dest_dir / f"{src.stem}.parquet"
+        return cur.execute(
+            f"COPY ({query}) TO {sql_str(dest)} (FORMAT PARQUET, COMPRESSION ZSTD, RETURN_FILES true{options})"
+        ).fetchone()[1]
+    finally:
+        cur.close()
+
+def convert(pattern, dest_dir, to="parquet", extra_columns="", partition_by="", layout=None, workers=WORKERS):
+    """Convert every file matching pattern, skipping those unchanged since their last conversion"""
+    t0 = time.perf_counter()
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    files = sorted(Path().glob(pattern))
+    if not files:
+        print(f"No files match {pattern}")
+        return
+
+    converted = load_json(CONVERTED)
+    todo = []
+    for src in files:
+        seen = converted.get(str(src))
+        if seen and seen["fingerprint"] == fingerprint(src) and all(Path(p).exists() for p in seen["outputs"]):
+            continue
+        # Drop what an older version of this file produced before rewriting it
+        for p in (seen or {}).get("outputs", []):
+            Path(p).unlink(missing_ok=True)
+        todo.append(src)
+
+    # Files in dest_dir that no converted source wrote, e.g. the single data_0.parquet per
+    # partition of the writer this module replaced: they would be read alongside the new files
+    owned = {Path(p).resolve() for seen in converted.values() for p in seen["outputs"]}
+    for p in sorted(dest_dir.glob(output_glob(to, partition_by))):
+        if p.resolve() not in owned:
+            p.unlink()
+            if partition_by and not any(p.parent.iterdir()):
+                p.parent.rmdir()
+            print(f"Removed {p}: written by no converted source")
+
+    # One database for all workers: cursors share its thread budget and memory limit
+    con = get_connection()
+    # Sniffed before the pool starts, so workers never write the schema cache
+    schemas = {src: sniffed_schema(con, pattern, src) if to == "parquet" else None for src in todo}
+    insertion_order = con.execute("SELECT current_setting('preserve_insertion_order')").fetchone()[0]
+    # Lets COPY stream rows out in any order instead of buffering to keep input order
+    con.execute("SET preserve_insertion_order = false")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outputs = pool.map(
+                lambda src: convert_file(con, src, dest_dir, schemas[src], to, extra_columns, partition_by, layout),
+                todo,
+            )
+            STATE.mkdir(parents=True, exist_ok=True)
+            for src, written in zip(todo, outputs):
+                # Record each file as it lands so an interrupted backfill resumes where it stopped
+                converted[str(src)] = {"fingerprint": fingerprint(src), "outputs": written}
+                save_manifest(CONVERTED, converted)
+                print(f"Converted {src.name} -> {', '.join(Path(p).name for p in written)}")
+    finally:
+        # The connection is shared with the rest of the process
+        con.execute(f"SET preserve_insertion_order = {insertion_order}")
+
+    print(f"OK → {len(todo)} converted, {len(files) - len(todo)} unchanged, {time.perf_counter() - t0:.2f}s")
@@ -2,7 +2,7 @@ select * from "out/orders_2025-10.parquet";
 
 
 
-select * from "out/orders_daily_incr.parquet";
+select * from read_parquet('out/orders_daily_incr/*/*.parquet', hive_partitioning = true);
 
 
 
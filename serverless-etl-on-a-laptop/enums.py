@@ -0,0 +1,60 @@
+# Low-cardinality columns are DuckDB ENUMs rather than VARCHAR: a value is stored as a small integer
+# code into its type's dictionary, so GROUP BY and joins hash and compare codes instead of strings,
+# and Parquet output is dictionary-encoded. The generators draw their values from these lists too.
+
+ORDER_STATUS = ("shipped", "pending", "cancelled", "other")  # after etl_orders.py normalizes it
+SEGMENTS = ("Premium", "Standard", "Budget", "Enterprise")
+CUSTOMER_TYPES = ("B2B", "B2C", "Wholesale")
+LOYALTY_TIERS = ("Gold", "Silver", "Bronze", "New")
+REGIONS = ("North", "South", "East", "West", "Central")
+ACQUISITION_CHANNELS = ("Online", "Referral", "Direct", "Partner", "Social Media", "Email Campaign")
+
+# Type name -> values, created on every connection by connection.get_connection()
+ENUMS = {
+    "order_status": ORDER_STATUS,
+    "segment": SEGMENTS,
+    "customer_type": CUSTOMER_TYPES,
+    "loyalty_tier": LOYALTY_TIERS,
+    "region": REGIONS,
+    "acquisition_channel": ACQUISITION_CHANNELS,
+}
+
+# Table loaded with connection.load_table() -> {column: ENUM type}
+COLUMNS = {
+    "dim_customer": {
+        "segment": "segment",
+        "customer_type": "customer_type",
+        "loyalty_tier": "loyalty_tier",
+        "region": "region",
+        "acquisition_channel": "acquisition_channel",
+    },
+}
+
+# Raw order_status -> clean status: the first ILIKE pattern that matches, 'other' when none does
+STATUS_RULES = (("shipp%", "shipped"), ("pend%", "pending"), ("canc%", "cancelled"))
+
+def create_enums(con):
+    for name, values in ENUMS.items():
+        quoted = ", ".join("'" + v.replace("'", "''") + "'" for v in values)
+        con.execute(f"CREATE TYPE IF NOT EXISTS {name} AS ENUM ({quoted})")
+
+def replace_enums(table):
+    """A SELECT list casting table's ENUM columns, e.g. "* REPLACE (segment::segment AS segment)" """
+    columns = COLUMNS.get(table)
+    if not columns:
+        return "*"
+    return "* REPLACE (" + ", ".join(f"{c}::{t} AS {c}" for c, t in columns.items()) + ")"
+
+def status_map(con, source, column="order_status"):
+    """Map every distinct raw status in source to its clean status once, as table order_status_map.
+
+    The rules then run once per distinct spelling instead of once per row; the transform joins
+    against the map.
+    """
+    rules = " ".join(f"WHEN raw ILIKE '{pattern}' THEN '{status}'" for pattern, status in STATUS_RULES)
+    con.execute(f"""
+        CREATE OR REPLACE TABLE order_status_map AS
+        SELECT raw, (CASE {rules} ELSE 'other' END)::order_status AS status
+        FROM (SELECT DISTINCT {column} AS raw FROM {source} WHERE {column} IS NOT NULL)
+    """)
+    return "order_status_map"
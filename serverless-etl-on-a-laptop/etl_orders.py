@@ -1,80 +1,142 @@
-import duckdb as dd
+import sys
 from pathlib import Path
-from time import perf_counter
-from contextlib import contextmanager
 from datetime import datetime
+from layout import apply_layout
+import profiling
+from connection import create_stage
+from enums import status_map
+from pipeline import stage, run_dag
+from checks import ORDERS_CLEAN, check_columns, check_results, assert_checks
 
 RAW = Path("data/raw")         # drop *.parquet or *.csv here
 STAGE = Path("data/stage")
 OUT = Path("data/out")
 STAGE.mkdir(parents=True, exist_ok=True); OUT.mkdir(parents=True, exist_ok=True)
 
-con = dd.connect(database=":memory:", read_only=False)  # pure in-memory engine
+# Publish mode: "partitioned" (single pass), "per_month" (one COPY per month) or "compare"
+PUBLISH_MODE = sys.argv[1] if len(sys.argv) > 1 else "partitioned"
+# order_status is an ENUM, which sorts in declaration order: the cast keeps the files in name order
+LAYOUT = {"sort_by": ("ds", "order_status::VARCHAR")}  # see layout.apply_layout
 
-@contextmanager
-def timer(name):
-    t0 = perf_counter()
-    yield
-    dt = perf_counter() - t0
-    print(f"{name}: {dt:.2f}s")
+def ingest(cur):
+    """1) Ingest: lazily scan columns you actually need"""
+    cur.execute(f"""
+        CREATE OR REPLACE VIEW orders AS
+        SELECT order_id, customer_id, order_status, total, ds
+        FROM read_parquet('{RAW / "orders_*.parquet"}')
+    """)
 
-# 1) Ingest: lazily scan columns you actually need
-con.execute(f"""
-    CREATE OR REPLACE VIEW orders AS
-    SELECT order_id, customer_id, order_status, total, ds
-    FROM read_parquet('{RAW / "orders_*.parquet"}')
-""")
+def transform(cur):
+    """2) Transform: tidy enums, filter junk, standardize dates
 
-# 2) Transform: tidy enums, filter junk, standardize dates
-con.execute("""
-    CREATE OR REPLACE TABLE orders_clean AS
-    SELECT
-        order_id::BIGINT,
-        customer_id::BIGINT,
-        CASE
-            WHEN order_status ILIKE 'shipp%' THEN 'shipped'
-            WHEN order_status ILIKE 'pend%'  THEN 'pending'
-            WHEN order_status ILIKE 'canc%'  THEN 'cancelled'
-            ELSE 'other'
-        END AS order_status,
-        CAST(total AS DOUBLE) AS total,
-        CAST(ds AS DATE)       AS ds
-    FROM orders
-    WHERE total IS NOT NULL AND total >= 0
-""")
+    A table under the default profile, a view under ETL_PROFILE=bounded.
+    """
+    # Statuses are normalized once per distinct spelling (enums.STATUS_RULES), then looked up
+    status_map(cur, "orders")
+    create_stage(cur, "orders_clean", """
+        SELECT
+            o.order_id::BIGINT AS order_id,
+            o.customer_id::BIGINT AS customer_id,
+            coalesce(m.status, 'other'::order_status) AS order_status,
+            CAST(o.total AS DOUBLE) AS total,
+            CAST(o.ds AS DATE)       AS ds
+        FROM orders o
+        LEFT JOIN order_status_map m ON o.order_status = m.raw
+        WHERE o.total IS NOT NULL AND o.total >= 0
+    """)
 
-# 3) Validate: cheap data tests that actually catch pain
-result = con.execute("""
-    SELECT
-      COUNT(*)                       AS rows_total,
-      SUM(total < 0)                 AS neg_totals,
-      SUM(order_status NOT IN ('shipped','pending','cancelled','other')) AS bad_status
-    FROM orders_clean
-""")
-tests = result.fetchone()
+def aggregate(cur):
+    """3) Aggregate & validate in one scan: daily totals plus a violation count per check"""
+    cur.execute(f"""
+        CREATE OR REPLACE TABLE orders_daily AS
+        SELECT ds, order_status, COUNT(*) AS orders, SUM(total) AS gross,
+               {check_columns(ORDERS_CLEAN)}
+        FROM orders_clean
+        GROUP BY ALL
+    """)
+    assert_checks("orders_clean", check_results(cur, "orders_daily", ORDERS_CLEAN))
 
-assert tests is not None, "No test results returned"
-assert tests[1] == 0, "Negative totals found"
-assert tests[2] == 0, "Unexpected order_status values"
+# The published daily totals, computed from orders_clean (aggregate() computes them with the checks)
+DAILY = """
+    SELECT ds, order_status, COUNT(*) AS orders, SUM(total) AS gross
+    FROM orders_clean
+    {where}
+    GROUP BY ALL
+"""
 
-# 4) Aggregate & publish - generate monthly files with date suffix
-with timer("aggregate & write"):
+# 4) Publish - generate monthly files with date suffix
+def publish_per_month(cur):
+    """One COPY per month, each aggregating orders_clean again: the baseline the partitioned path
+    is compared with. Returns the files written"""
     # Get the distinct months from the data
-    months = con.execute("""
+    months = cur.execute("""
         SELECT DISTINCT strftime(ds, '%Y-%m') AS month
         FROM orders_clean
         ORDER BY month
     """).fetchall()
     
+    written = []
     for (month,) in months:
         output_file = OUT / f"orders_{month}.parquet"
-        con.execute(f"""
-            COPY (
-              SELECT ds, order_status, COUNT(*) AS orders, SUM(total) AS gross
-              FROM orders_clean
-              WHERE strftime(ds, '%Y-%m') = '{month}'
-              GROUP BY ALL
-              ORDER BY ds, order_status
-            ) TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD)
+        query, options = apply_layout(DAILY.format(where=f"WHERE strftime(ds, '%Y-%m') = '{month}'"), LAYOUT)
+        cur.execute(f"""
+            COPY ({query}) TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD{options})
         """)
-        print(f"OK → {output_file}")
\ No newline at end of file
+        print(f"OK → {output_file}")
+        written.append(output_file)
+    return written
+
+def publish_partitioned(cur, daily="orders_daily"):
+    """Write every month in a single partitioned COPY of daily; returns the files written"""
+    staging = STAGE / "orders_monthly"
+    query, options = apply_layout(f"""
+          SELECT ds, order_status, orders, gross, strftime(ds, '%Y-%m') AS month
+          FROM {daily}
+    """, LAYOUT)
+    cur.execute(f"""
+        COPY ({query}) TO '{staging}' (FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY (month), OVERWRITE{options})
+    """)
+
+    # Keep the orders_{YYYY-MM}.parquet naming downstream consumers expect: one file per month.
+    # A partition DuckDB split into several files (e.g. past partitioned_write_flush_threshold rows)
+    # fails the run before anything is moved, rather than publishing part of a month
+    partitions = {p: sorted(p.glob("*.parquet")) for p in sorted(staging.glob("month=*"))}
+    split = [f"{p.name} ({len(files)} files)" for p, files in partitions.items() if len(files) != 1]
+    if split:
+        raise ValueError(f"Partitioned publish wrote other than one file for {', '.join(split)}; "
+                         f"nothing was published (python etl_orders.py per_month writes one COPY per month)")
+    written = []
+    for partition, (file,) in partitions.items():
+        month = partition.name.split("=", 1)[1]
+        output_file = OUT / f"orders_{month}.parquet"
+        file.replace(output_file)
+        partition.rmdir()
+        print(f"OK → {output_file}")
+        written.append(output_file)
+    return written
+
+def publish(cur):
+    """Write the monthly files in PUBLISH_MODE; returns the files written"""
+    if PUBLISH_MODE == "compare":
+        # Both paths aggregate orders_clean, so the timings compare N scans with one
+        with profiling.stage("aggregate & write (per month)"):
+            publish_per_month(cur)
+        with profiling.stage("aggregate & write (partitioned)"):
+            return publish_partitioned(cur, f"({DAILY.format(where='')})")
+    elif PUBLISH_MODE == "per_month":
+        return publish_per_month(cur)
+    else:
+        return publish_partitioned(cur)
+
+STAGES = [
+    stage("orders.ingest", ingest, inputs=[str(RAW / "orders_*.parquet")]),
+    stage("orders.transform", transform, after=["orders.ingest"]),
+    stage("orders.aggregate", aggregate, after=["orders.transform"]),
+    # orders_????-?? rather than orders_*, which also matches incremental.py's orders_daily_incr
+    stage("orders.publish", publish, after=["orders.aggregate"], outputs=[str(OUT / "orders_????-??.parquet")],
+          version=[PUBLISH_MODE]),
+]
+
+if __name__ == "__main__":
+    # compare is for timing the two publish paths, so it never skips them
+    run_dag(STAGES, force=PUBLISH_MODE == "compare")
@@ -0,0 +1,146 @@
+import json
+import os
+import shutil
+from pathlib import Path
+from connection import get_connection, load_table
+from layout import apply_layout, CUSTOMER_DAILY
+from manifest import (load_manifest, save_manifest, discover, file_list, affected_partitions, covering_files,
+                      record_files)
+
+FEATURES = Path("data/features")
+META = FEATURES / "meta.json"  # raw files already folded into customer_daily
+RAW_GLOB = "data/raw/orders_*.parquet"
+DAILY = FEATURES / "customer_daily"  # one ds=YYYY-MM-DD partition per day
+STAGE = Path("data/stage/features")  # a first build is written here, then swapped into FEATURES
+JOURNAL = STAGE / "swap.json"  # the swap in progress, finished by the next run if this one crashes
+
+# Rollups of customer_daily: grain -> (directory, partition key computed from ds)
+ROLLUPS = {
+    "week": (FEATURES / "customer_weekly", "date_trunc('week', ds)::DATE"),
+    "month": (FEATURES / "customer_monthly", "strftime(ds, '%Y-%m')"),
+}
+
+# Only mergeable measures are stored, so a rollup sums them and stays exact. An order belongs to one
+# customer and one day, so distinct orders add up too; avg_ticket is re-derived at every grain, and
+# distinct customers are exact from any rollup because customer_id is part of every grain.
+DAILY_MEASURES = "COUNT(*) AS orders, COUNT(DISTINCT order_id) AS distinct_orders, SUM(total) AS gross"
+# (integer sums are HUGEINT, which Parquet would store as DOUBLE, hence the casts)
+ROLLUP_MEASURES = ("SUM(orders)::BIGINT AS orders, SUM(distinct_orders)::BIGINT AS distinct_orders, "
+                   "SUM(gross) AS gross, COUNT(*) AS active_days")
+
+def scan(grain="day", root=FEATURES):
+    """read_parquet over customer_daily or one of its rollups, partition key included as a column"""
+    directory = root / (DAILY if grain == "day" else ROLLUPS[grain][0]).name
+    return f"read_parquet('{directory / '*' / '*.parquet'}', hive_partitioning = true)"
+
+def swap_in(names):
+    """Replace the FEATURES directories names with their staged builds.
+
+    Each directory is moved aside and the staged one renamed into its place, so it is missing only
+    between two renames. The swap is journaled first, and finish_swap() completes it from the journal
+    if this run dies halfway.
+    """
+    save_manifest(JOURNAL, {"directories": names})
+    finish_swap()
+
+def finish_swap():
+    """Complete the journaled swap, if any: move each old directory aside, the staged one in, then
+    delete the old one"""
+    if not JOURNAL.exists():
+        return
+    for name in json.loads(JOURNAL.read_text())["directories"]:
+        staged, target, replaced = STAGE / name, FEATURES / name, STAGE / "replaced" / name
+        if staged.exists():
+            if target.exists() and not replaced.exists():
+                replaced.parent.mkdir(parents=True, exist_ok=True)
+                os.replace(target, replaced)
+            os.replace(staged, target)
+        shutil.rmtree(replaced, ignore_errors=True)
+    JOURNAL.unlink()
+
+def refresh(con, layout=CUSTOMER_DAILY):
+    """Fold new or changed raw files into customer_daily, then rebuild the weeks and months they touch"""
+    finish_swap()  # a first build an earlier run did not get to swap in
+    state = load_manifest(META)
+    # First build: written from scratch under STAGE and swapped in once complete, rather than mixing
+    # in partitions of unknown origin or deleting the current directories before there is a new one
+    first = not state["files"]
+    root = STAGE if first else FEATURES
+    daily = root / DAILY.name
+    if first:
+        for directory in [DAILY, *(d for d, _ in ROLLUPS.values())]:
+            shutil.rmtree(root / directory.name, ignore_errors=True)
+    pending, dropped = discover(RAW_GLOB, state)
+    if not pending and not dropped:
+        return set()
+
+    affected = affected_partitions(con, pending, state, dropped)
+    sources = sorted({str(f) for f in pending} | covering_files(state, pending, affected))
+    days = f"(SELECT unnest({sorted(affected)}::DATE[]) AS ds)"
+
+    for ds in affected:
+        shutil.rmtree(daily / f"ds={ds}", ignore_errors=True)
+    daily.mkdir(parents=True, exist_ok=True)
+    # No sources left: the touched days only held rows of deleted files
+    if sources:
+        query, options = apply_layout(f"""
+            SELECT customer_id, ds, {DAILY_MEASURES}, SUM(total) / COUNT(*) AS avg_ticket
+            FROM read_parquet({file_list(sources)})
+            WHERE ds IN (SELECT ds FROM {days})
+            GROUP BY customer_id, ds
+        """, layout)
+        con.execute(f"""
+            COPY ({query}) TO '{daily}' (FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY (ds), OVERWRITE_OR_IGNORE{options})
+        """)
+
+    # Rollups read the daily partitions, never raw rows, and only for the periods that changed
+    for grain, (directory, key) in ROLLUPS.items():
+        directory = root / directory.name
+        periods = [p for (p,) in con.execute(f"SELECT DISTINCT ({key})::VARCHAR FROM {days}").fetchall()]
+        if not periods:
+            continue
+        # The days those periods span, so only their daily partitions are opened
+        lo, hi = con.execute(f"""
+            SELECT min(date_trunc('{grain}', ds))::DATE, max(date_trunc('{grain}', ds) + INTERVAL 1 {grain})::DATE
+            FROM {days}
+        """).fetchone()
+        for period in periods:
+            shutil.rmtree(directory / f"{grain}={period}", ignore_errors=True)
+        directory.mkdir(parents=True, exist_ok=True)
+        query, options = apply_layout(f"""
+            SELECT customer_id, {key} AS {grain}, {ROLLUP_MEASURES}, SUM(gross) / SUM(orders) AS avg_ticket
+            FROM {scan(root=root)}
+            WHERE ds >= DATE '{lo}' AND ds < DATE '{hi}'
+              AND ({key})::VARCHAR IN (SELECT unnest({periods}::VARCHAR[]))
+            GROUP BY ALL
+        """, layout)
+        con.execute(f"""
+            COPY ({query}) TO '{directory}' (FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY ({grain}), OVERWRITE_OR_IGNORE{options})
+        """)
+
+    if first:
+        swap_in([DAILY.name, *(d.name for d, _ in ROLLUPS.values())])
+    record_files(con, state, pending)
+    save_manifest(META, state)
+    print(f"Features → {len(pending)} new files, {len(dropped)} removed, {len(affected)} days"
+          + (f" ({min(affected)} .. {max(affected)})" if affected else ""))
+    return affected
+
+if __name__ == "__main__":
+    con = get_connection()
+    refresh(con)
+    load_table(con, "dim_customer", "data/dim_customer.parquet")
+    # Segment-level monthly figures straight from the monthly rollup
+    rows = con.execute(f"""
+        SELECT m.month, d.segment,
+               COUNT(DISTINCT m.customer_id) AS customers,
+               SUM(m.distinct_orders) AS orders,
+               SUM(m.gross) AS gross,
+               SUM(m.gross) / SUM(m.orders) AS avg_ticket
+        FROM {scan('month')} m
+        JOIN dim_customer d USING (customer_id)
+        GROUP BY ALL
+        ORDER BY ALL
+    """).fetchall()
+    for month, segment, customers, orders, gross, avg_ticket in rows:
+        print(f"{month}  {segment:<10} {customers:>6} customers {orders:>8} orders {gross:>14.2f} gross {avg_ticket:>8.2f} avg")
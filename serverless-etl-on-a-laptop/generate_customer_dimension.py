@@ -1,152 +1,182 @@
+import argparse
+import shutil
 import duckdb as dd
-import random
+import numpy as np
+import pyarrow as pa
 from pathlib import Path
-from datetime import datetime, timedelta
+from datetime import datetime
 from faker import Faker
+from generation import shard_seeds, run_shards
+from layout import apply_layout
+from enums import SEGMENTS, CUSTOMER_TYPES, LOYALTY_TIERS, REGIONS, ACQUISITION_CHANNELS
 
 # Setup
 fake = Faker()
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+SHARD_DIR = DATA_DIR / "stage" / "dim_customer"
 
 # Configuration
 NUM_CUSTOMERS = 5000  # Generate 5000 unique customers
+POOL_SIZE = 10000     # Distinct Faker values per string column, sampled by index
+SHARD_SIZE = 100000   # Customers per worker shard; output depends on this, not on the worker count
+SEED = 42
+LAYOUT = {"sort_by": ("customer_id",)}  # dimension lookups and joins are by customer_id
 
-SEGMENTS = ['Premium', 'Standard', 'Budget', 'Enterprise']
-CUSTOMER_TYPES = ['B2B', 'B2C', 'Wholesale']
-LOYALTY_TIERS = ['Gold', 'Silver', 'Bronze', 'New']
-REGIONS = ['North', 'South', 'East', 'West', 'Central']
-ACQUISITION_CHANNELS = ['Online', 'Referral', 'Direct', 'Partner', 'Social Media', 'Email Campaign']
+def build_pool(generator, size):
+    """Call a Faker generator once per pool slot"""
+    return pa.array([generator() for _ in range(size)])
 
-def generate_customers():
-    """Generate customer dimension data"""
-    customers = []
+def sample(pool, size, rng):
+    """Draw pool values by index"""
+    return pool.take(rng.integers(0, len(pool), size=size))
+
+def categorical(values, size, rng):
+    """Random choice over a small list, dictionary-encoded"""
+    codes = rng.integers(0, len(values), size=size, dtype=np.int8)
+    return pa.DictionaryArray.from_arrays(codes, pa.array(values))
+
+def build_pools(num_customers, seed):
+    """Faker value pools shared by every shard"""
+    Faker.seed(seed)
+    pool_size = min(num_customers, POOL_SIZE)
+    return {
+        'customer_name': build_pool(fake.name, pool_size),
+        'email': build_pool(fake.email, pool_size),
+        'phone': build_pool(fake.phone_number, pool_size),
+        'city': build_pool(fake.city, pool_size),
+        'state': build_pool(fake.state, pool_size),
+        'zip_code': build_pool(fake.zipcode, pool_size),
+        'account_manager': build_pool(fake.name, pool_size),
+    }
+
+def generate_customers(customer_ids, pools, today, rng):
+    """Generate customer dimension data as a columnar Arrow table"""
+    num_customers = len(customer_ids)
     
-    # Use consistent customer IDs that match the orders (1000-9999)
-    customer_ids = list(range(1000, 10000))
-    random.shuffle(customer_ids)
+    # Generate acquisition date (last 3 years) and a last order on or after it
+    acquisition_date = today - rng.integers(1, 3 * 365 + 1, size=num_customers)
+    days_since_acquisition = (today - acquisition_date).astype(np.int64)
+    last_order_date = acquisition_date + (rng.random(num_customers) * (days_since_acquisition + 1)).astype(np.int64)
+    days_since_last = (today - last_order_date).astype(np.int32)
     
-    for i in range(NUM_CUSTOMERS):
-        customer_id = customer_ids[i]
-        
-        # Generate acquisition date (last 3 years)
-        acquisition_date = fake.date_between(start_date='-3y', end_date='-1d')
-        last_order_date = fake.date_between(start_date=acquisition_date, end_date='today')
-        days_since_last = (datetime.now().date() - last_order_date).days
-        
-        # Generate business metrics
-        total_orders = random.randint(1, 500)
-        lifetime_value = round(random.uniform(100, 50000), 2)
-        average_order_value = round(lifetime_value / total_orders, 2)
-        
-        # Determine activity status
-        is_active = days_since_last <= 180  # Active if ordered in last 6 months
-        
-        customer = {
-            'customer_id': customer_id,
-            'customer_name': fake.name(),
-            'email': fake.email(),
-            'phone': fake.phone_number(),
-            'segment': random.choice(SEGMENTS),
-            'customer_type': random.choice(CUSTOMER_TYPES),
-            'loyalty_tier': random.choice(LOYALTY_TIERS),
-            'city': fake.city(),
-            'state': fake.state(),
-            'country': 'USA',
-            'zip_code': fake.zipcode(),
-            'region': random.choice(REGIONS),
-            'acquisition_date': acquisition_date.strftime('%Y-%m-%d'),
-            'acquisition_channel': random.choice(ACQUISITION_CHANNELS),
-            'account_manager': fake.name(),
-            'is_active': is_active,
-            'credit_limit': round(random.uniform(1000, 100000), 2),
-            'lifetime_value': lifetime_value,
-            'average_order_value': average_order_value,
-            'total_orders': total_orders,
-            'last_order_date': last_order_date.strftime('%Y-%m-%d'),
-            'days_since_last_order': days_since_last
-        }
-        
-        customers.append(customer)
+    # Generate business metrics
+    total_orders = rng.integers(1, 501, size=num_customers)
+    lifetime_value = rng.uniform(100, 50000, size=num_customers).round(2)
+    average_order_value = (lifetime_value / total_orders).round(2)
     
-    return customers
+    return pa.table({
+        'customer_id': customer_ids,
+        'customer_name': sample(pools['customer_name'], num_customers, rng),
+        'email': sample(pools['email'], num_customers, rng),
+        'phone': sample(pools['phone'], num_customers, rng),
+        'segment': categorical(SEGMENTS, num_customers, rng),
+        'customer_type': categorical(CUSTOMER_TYPES, num_customers, rng),
+        'loyalty_tier': categorical(LOYALTY_TIERS, num_customers, rng),
+        'city': sample(pools['city'], num_customers, rng),
+        'state': sample(pools['state'], num_customers, rng),
+        'country': pa.DictionaryArray.from_arrays(np.zeros(num_customers, dtype=np.int8), pa.array(['USA'])),
+        'zip_code': sample(pools['zip_code'], num_customers, rng),
+        'region': categorical(REGIONS, num_customers, rng),
+        'acquisition_date': acquisition_date,
+        'acquisition_channel': categorical(ACQUISITION_CHANNELS, num_customers, rng),
+        'account_manager': sample(pools['account_manager'], num_customers, rng),
+        'is_active': days_since_last <= 180,  # Active if ordered in last 6 months
+        'credit_limit': rng.uniform(1000, 100000, size=num_customers).round(2),
+        'lifetime_value': lifetime_value,
+        'average_order_value': average_order_value,
+        'total_orders': total_orders,
+        'last_order_date': last_order_date,
+        'days_since_last_order': days_since_last,
+    })
 
-def main():
-    con = dd.connect(database=":memory:")
+# Per-process state shared by every shard a worker handles
+worker_state = {}
+
+def init_worker(pools, today):
+    worker_state['pools'] = pools
+    worker_state['today'] = today
+
+def write_shard(task):
+    """Generate one customer-id range and write it as its own Parquet part"""
+    shard, customer_ids, seed = task
+    customers = generate_customers(
+        customer_ids, worker_state['pools'], worker_state['today'], np.random.default_rng(seed)
+    )
     
+    output_file = SHARD_DIR / f"part_{shard:05d}.parquet"
+    con = dd.connect(database=":memory:", config={"threads": 1})  # parallelism comes from the pool
+    con.register("customers", customers)
+    con.execute(f"""
+        COPY (
+            SELECT
+                customer_id::BIGINT AS customer_id,
+                customer_name::VARCHAR AS customer_name,
+                email::VARCHAR AS email,
+                phone::VARCHAR AS phone,
+                segment::VARCHAR AS segment,
+                customer_type::VARCHAR AS customer_type,
+                loyalty_tier::VARCHAR AS loyalty_tier,
+                city::VARCHAR AS city,
+                state::VARCHAR AS state,
+                country::VARCHAR AS country,
+                zip_code::VARCHAR AS zip_code,
+                region::VARCHAR AS region,
+                acquisition_date::DATE AS acquisition_date,
+                acquisition_channel::VARCHAR AS acquisition_channel,
+                account_manager::VARCHAR AS account_manager,
+                is_active::BOOLEAN AS is_active,
+                credit_limit::DOUBLE AS credit_limit,
+                lifetime_value::DOUBLE AS lifetime_value,
+                average_order_value::DOUBLE AS average_order_value,
+                total_orders::BIGINT AS total_orders,
+                last_order_date::DATE AS last_order_date,
+                days_since_last_order::INTEGER AS days_since_last_order
+            FROM customers
+        ) TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD)
+    """)
+    con.close()
+    return output_file
+
+def main(num_customers=NUM_CUSTOMERS, seed=SEED, workers=None):
     print("Generating customer dimension data...")
-    customers = generate_customers()
     
-    # Create table with proper schema
-    con.execute("""
-        CREATE TABLE dim_customer (
-            customer_id BIGINT PRIMARY KEY,
-            customer_name VARCHAR,
-            email VARCHAR,
-            phone VARCHAR,
-            segment VARCHAR,
-            customer_type VARCHAR,
-            loyalty_tier VARCHAR,
-            city VARCHAR,
-            state VARCHAR,
-            country VARCHAR,
-            zip_code VARCHAR,
-            region VARCHAR,
-            acquisition_date DATE,
-            acquisition_channel VARCHAR,
-            account_manager VARCHAR,
-            is_active BOOLEAN,
-            credit_limit DOUBLE,
-            lifetime_value DOUBLE,
-            average_order_value DOUBLE,
-            total_orders BIGINT,
-            last_order_date DATE,
-            days_since_last_order INTEGER
-        )
-    """)
+    # Use consistent customer IDs that match the orders (1000-9999), widening the range past 9000 customers
+    rng = np.random.default_rng(seed)
+    customer_ids = rng.permutation(np.arange(1000, 1000 + max(num_customers, 9000)))[:num_customers]
     
-    # Insert data
-    for customer in customers:
-        con.execute("""
-            INSERT INTO dim_customer VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, [
-            customer['customer_id'],
-            customer['customer_name'],
-            customer['email'],
-            customer['phone'],
-            customer['segment'],
-            customer['customer_type'],
-            customer['loyalty_tier'],
-            customer['city'],
-            customer['state'],
-            customer['country'],
-            customer['zip_code'],
-            customer['region'],
-            customer['acquisition_date'],
-            customer['acquisition_channel'],
-            customer['account_manager'],
-            customer['is_active'],
-            customer['credit_limit'],
-            customer['lifetime_value'],
-            customer['average_order_value'],
-            customer['total_orders'],
-            customer['last_order_date'],
-            customer['days_since_last_order']
-        ])
+    # Shard by customer range; each shard gets its own seed and writes its own part
+    shutil.rmtree(SHARD_DIR, ignore_errors=True)
+    SHARD_DIR.mkdir(parents=True)
+    starts = range(0, num_customers, SHARD_SIZE)
+    tasks = [
+        (shard, customer_ids[start:start + SHARD_SIZE], shard_seed)
+        for shard, (start, shard_seed) in enumerate(zip(starts, shard_seeds(seed, len(starts))))
+    ]
+    today = np.datetime64(datetime.now().date(), 'D')
+    run_shards(write_shard, tasks, workers, init_worker, (build_pools(num_customers, seed), today))
+    
+    # Merge the parts into dim_customer
+    con = dd.connect(database=":memory:")
+    con.execute(f"""
+        CREATE TABLE dim_customer AS
+        SELECT * FROM read_parquet('{SHARD_DIR / "*.parquet"}')
+    """)
     
     # Write to parquet file
     output_file = DATA_DIR / "dim_customer.parquet"
+    query, options = apply_layout("SELECT * FROM dim_customer", LAYOUT)
     con.execute(f"""
-        COPY dim_customer TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD)
+        COPY ({query}) TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD{options})
     """)
     
-    # Print summary statistics
-    stats = con.execute("""
+    # Get segment breakdown from the in-memory table
+    segment_stats = con.execute("""
         SELECT 
-            COUNT(*) as total_customers,
-            COUNT(CASE WHEN is_active THEN 1 END) as active_customers,
             segment,
-            COUNT(*) as count_by_segment
+            COUNT(*) as count,
+            AVG(lifetime_value) as avg_ltv,
+            SUM(CASE WHEN is_active THEN 1 ELSE 0 END) as active_count
         FROM dim_customer
         GROUP BY segment
         ORDER BY segment
@@ -155,26 +185,16 @@ def main():
     con.close()
     
     print(f"\n✓ Created: {output_file}")
-    print(f"✓ Total customers: {len(customers)}")
+    print(f"✓ Total customers: {num_customers}")
     print(f"\n✓ Breakdown by segment:")
     
-    # Get segment breakdown
-    con2 = dd.connect(database=":memory:")
-    segment_stats = con2.execute(f"""
-        SELECT 
-            segment,
-            COUNT(*) as count,
-            AVG(lifetime_value) as avg_ltv,
-            SUM(CASE WHEN is_active THEN 1 ELSE 0 END) as active_count
-        FROM read_parquet('{output_file}')
-        GROUP BY segment
-        ORDER BY segment
-    """).fetchall()
-    
     for segment, count, avg_ltv, active in segment_stats:
         print(f"  {segment}: {count} customers (avg LTV: ${avg_ltv:.2f}, active: {active})")
-    
-    con2.close()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate the dim_customer Parquet file")
+    parser.add_argument("--customers", type=int, default=NUM_CUSTOMERS, help="number of customers")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    args = parser.parse_args()
+    main(args.customers, args.seed, args.workers)
@@ -1,8 +1,13 @@
+import argparse
 import duckdb as dd
-import random
+import numpy as np
+import pyarrow as pa
 from pathlib import Path
 from datetime import datetime, timedelta
 from faker import Faker
+from generation import shard_seeds, run_shards
+from layout import apply_layout, RAW_ORDERS
+from enums import SEGMENTS
 
 # Setup
 fake = Faker()
@@ -14,9 +19,12 @@ START_DATE = datetime(2025, 10, 1)
 END_DATE = datetime(2025, 10, 31)
 ROWS_PER_DAY_MIN = 200
 ROWS_PER_DAY_MAX = 500
+FIRST_ORDER_ID = 100000
+CUSTOMER_ID_MIN = 1000
+CUSTOMER_ID_MAX = 9999
+SEED = 42
 
 ORDER_STATUSES = ['shipped', 'pending', 'cancelled', 'new', 'other']
-SEGMENTS = ['Premium', 'Standard', 'Budget', 'Enterprise']
 ITEMS = [
     ('ITM001', 'Laptop'),
     ('ITM002', 'Mouse'),
@@ -35,42 +43,58 @@ ITEMS = [
     ('ITM015', 'SSD'),
 ]
 
-def generate_orders_for_date(date, num_orders, customer_segments):
-    """Generate random orders data for a specific date"""
-    orders = []
-    
-    for _ in range(num_orders):
-        order_id = fake.unique.random_int(min=100000, max=999999)
-        customer_id = random.randint(1000, 9999)
-        customer_name = fake.name()
-        status = random.choice(ORDER_STATUSES)
-        
-        # Get customer segment from mapping, or assign random if not found
-        segment = customer_segments.get(customer_id, random.choice(SEGMENTS))
-        
-        # Generate 1-5 items per order
-        num_items = random.randint(1, 5)
-        items_in_order = random.sample(ITEMS, num_items)
-        
-        total = 0
-        for item_id, item_name in items_in_order:
-            item_price = round(random.uniform(10.0, 500.0), 2)
-            total += item_price
-            
-            orders.append({
-                'order_id': order_id,
-                'customer_id': customer_id,
-                'customer_name': customer_name,
-                'customer_segment': segment,
-                'order_status': status,
-                'item_id': item_id,
-                'item_name': item_name,
-                'item_price': item_price,
-                'total': round(total, 2),
-                'ds': date.strftime('%Y-%m-%d')
-            })
-    
-    return orders
+def build_name_pool(seed):
+    """Pre-generate one customer name per customer_id (1000-9999)"""
+    Faker.seed(seed)
+    return pa.array([fake.name() for _ in range(CUSTOMER_ID_MIN, CUSTOMER_ID_MAX + 1)])
+
+def build_segment_lookup(customer_segments):
+    """Map customer_id -> segment code, -1 where the dimension has no entry"""
+    lookup = np.full(CUSTOMER_ID_MAX + 1, -1, dtype=np.int8)
+    for customer_id, segment in customer_segments.items():
+        if CUSTOMER_ID_MIN <= customer_id <= CUSTOMER_ID_MAX and segment in SEGMENTS:
+            lookup[customer_id] = SEGMENTS.index(segment)
+    return lookup
+
+def generate_orders_for_date(date, num_orders, first_order_id, segment_lookup, name_pool, rng):
+    """Generate one day of orders as a columnar Arrow table"""
+    # Order-level columns
+    order_ids = np.arange(first_order_id, first_order_id + num_orders, dtype=np.int64)
+    customer_ids = rng.integers(CUSTOMER_ID_MIN, CUSTOMER_ID_MAX + 1, size=num_orders)
+    statuses = rng.integers(0, len(ORDER_STATUSES), size=num_orders, dtype=np.int8)
+
+    # Get customer segment from mapping, or assign random if not found
+    segments = segment_lookup[customer_ids]
+    missing = segments < 0
+    segments[missing] = rng.integers(0, len(SEGMENTS), size=int(missing.sum()), dtype=np.int8)
+
+    # Generate 1-5 distinct items per order: the first n columns of a random permutation
+    num_items = rng.integers(1, 6, size=num_orders)
+    permutations = rng.random((num_orders, len(ITEMS))).argsort(axis=1)
+    item_codes = permutations[np.arange(len(ITEMS)) < num_items[:, None]].astype(np.int8)
+
+    # Expand order-level columns to one row per line item
+    line_order = np.repeat(np.arange(num_orders), num_items)
+    num_lines = len(line_order)
+
+    # Running order total per line, as the row-by-row generator produced
+    item_prices = rng.uniform(10.0, 500.0, size=num_lines).round(2)
+    running = np.cumsum(item_prices)
+    order_start = np.cumsum(num_items) - num_items
+    totals = (running - np.repeat(running[order_start] - item_prices[order_start], num_items)).round(2)
+
+    return pa.table({
+        'order_id': order_ids[line_order],
+        'customer_id': customer_ids[line_order],
+        'customer_name': name_pool.take(customer_ids[line_order] - CUSTOMER_ID_MIN),
+        'customer_segment': pa.DictionaryArray.from_arrays(segments[line_order], pa.array(SEGMENTS)),
+        'order_status': pa.DictionaryArray.from_arrays(statuses[line_order], pa.array(ORDER_STATUSES)),
+        'item_id': pa.DictionaryArray.from_arrays(item_codes, pa.array([i for i, _ in ITEMS])),
+        'item_name': pa.DictionaryArray.from_arrays(item_codes, pa.array([n for _, n in ITEMS])),
+        'item_price': item_prices,
+        'total': totals,
+        'ds': pa.array(np.full(num_lines, np.datetime64(date.date(), 'D'))),
+    })
 
 def load_customer_segments():
     """Load customer segments from dimension file if it exists"""
@@ -87,68 +111,69 @@ def load_customer_segments():
         print("⚠ Customer dimension file not found. Using random segments.")
         return {}
 
-def main():
-    con = dd.connect(database=":memory:")
+# Per-process state shared by every shard a worker handles
+worker_state = {}
+
+def init_worker(segment_lookup, name_pool, layout):
+    worker_state['segment_lookup'] = segment_lookup
+    worker_state['name_pool'] = name_pool
+    worker_state['layout'] = layout
+
+def write_day(task):
+    """Generate and write one day's file; a worker's whole unit of work"""
+    date, first_order_id, rows_per_day_min, rows_per_day_max, seed = task
+    rng = np.random.default_rng(seed)
+    num_orders = int(rng.integers(rows_per_day_min, rows_per_day_max + 1))
+    orders = generate_orders_for_date(
+        date, num_orders, first_order_id,
+        worker_state['segment_lookup'], worker_state['name_pool'], rng
+    )
     
+    # Hand the Arrow batch to DuckDB and write it with a single COPY
+    output_file = RAW / f"orders_{date.strftime('%Y-%m-%d')}.parquet"
+    con = dd.connect(database=":memory:", config={"threads": 1})  # parallelism comes from the pool
+    con.register("temp_orders", orders)
+    query, options = apply_layout("SELECT * FROM temp_orders", worker_state['layout'])
+    con.execute(f"""
+        COPY ({query}) TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD{options})
+    """)
+    con.close()
+    return output_file, orders.num_rows
+
+def main(rows_per_day_min=ROWS_PER_DAY_MIN, rows_per_day_max=ROWS_PER_DAY_MAX, seed=SEED, workers=None,
+         layout=RAW_ORDERS):
     # Load customer segments from dimension file
-    customer_segments = load_customer_segments()
-    
-    current_date = START_DATE
-    files_created = []
+    segment_lookup = build_segment_lookup(load_customer_segments())
+    name_pool = build_name_pool(seed)
     
-    while current_date <= END_DATE:
-        num_orders = random.randint(ROWS_PER_DAY_MIN, ROWS_PER_DAY_MAX)
-        orders = generate_orders_for_date(current_date, num_orders, customer_segments)
-        
-        # Create a temporary table with the data
-        con.execute("DROP TABLE IF EXISTS temp_orders")
-        con.execute("""
-            CREATE TABLE temp_orders (
-                order_id BIGINT,
-                customer_id BIGINT,
-                customer_name VARCHAR,
-                customer_segment VARCHAR,
-                order_status VARCHAR,
-                item_id VARCHAR,
-                item_name VARCHAR,
-                item_price DOUBLE,
-                total DOUBLE,
-                ds DATE
-            )
-        """)
-        
-        # Insert the generated data
-        for order in orders:
-            con.execute("""
-                INSERT INTO temp_orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, [
-                order['order_id'],
-                order['customer_id'],
-                order['customer_name'],
-                order['customer_segment'],
-                order['order_status'],
-                order['item_id'],
-                order['item_name'],
-                order['item_price'],
-                order['total'],
-                order['ds']
-            ])
-        
-        # Write to parquet file
-        output_file = RAW / f"orders_{current_date.strftime('%Y-%m-%d')}.parquet"
-        con.execute(f"""
-            COPY temp_orders TO '{output_file}' (FORMAT PARQUET, COMPRESSION ZSTD)
-        """)
-        
-        files_created.append(output_file)
-        print(f"Created: {output_file} ({len(orders)} rows)")
-        
-        current_date += timedelta(days=1)
+    # One shard per day, each with its own seed and a disjoint order_id range
+    dates = [START_DATE + timedelta(days=i) for i in range((END_DATE - START_DATE).days + 1)]
+    tasks = [
+        (date, FIRST_ORDER_ID + i * rows_per_day_max, rows_per_day_min, rows_per_day_max, shard_seed)
+        for i, (date, shard_seed) in enumerate(zip(dates, shard_seeds(seed, len(dates))))
+    ]
     
-    con.close()
+    files_created = run_shards(write_day, tasks, workers, init_worker, (segment_lookup, name_pool, layout))
+    for output_file, num_rows in files_created:
+        print(f"Created: {output_file} ({num_rows} rows)")
+    total_rows = sum(num_rows for _, num_rows in files_created)
     
-    print(f"\n✓ Generated {len(files_created)} files in {RAW}")
+    print(f"\n✓ Generated {len(files_created)} files in {RAW} ({total_rows} rows)")
     print(f"✓ Date range: {START_DATE.strftime('%Y-%m-%d')} to {END_DATE.strftime('%Y-%m-%d')}")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Generate daily raw order files")
+    parser.add_argument("--orders-min", type=int, default=ROWS_PER_DAY_MIN, help="minimum orders per day")
+    parser.add_argument("--orders-max", type=int, default=ROWS_PER_DAY_MAX, help="maximum orders per day")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    parser.add_argument("--sort-by", default=",".join(RAW_ORDERS["sort_by"]), help="comma-separated sort keys")
+    parser.add_argument("--zorder", default="", help="comma-separated columns to Z-order cluster on instead")
+    parser.add_argument("--row-group-size", type=int, default=None)
+    args = parser.parse_args()
+    layout = {
+        "sort_by": tuple(c for c in args.sort_by.split(",") if c),
+        "zorder": tuple(c for c in args.zorder.split(",") if c),
+        "row_group_size": args.row_group_size,
+    }
+    main(args.orders_min, args.orders_max, args.seed, args.workers, layout)
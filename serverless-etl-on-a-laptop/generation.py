@@ -0,0 +1,21 @@
+import os
+import multiprocessing
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+def shard_seeds(seed, num_shards):
+    """Independent child seeds, one per shard, stable for a given root seed"""
+    return np.random.SeedSequence(seed).spawn(num_shards)
+
+def run_shards(worker, tasks, workers=None, initializer=None, initargs=()):
+    """Run worker over every task in a process pool, returning results in task order"""
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        if initializer is not None:
+            initializer(*initargs)
+        return [worker(task) for task in tasks]
+
+    # Spawn rather than fork: the parent may already be running DuckDB threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=initializer, initargs=initargs) as pool:
+        return list(pool.map(worker, tasks))
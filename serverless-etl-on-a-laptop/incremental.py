@@ -1,32 +1,49 @@
-import duckdb as dd, json
+import shutil
 from pathlib import Path
+from connection import get_connection
+from manifest import (load_manifest, save_manifest, discover, file_list, affected_partitions, covering_files,
+                      record_files)
 
 META = Path("data/meta.json")
-state = json.loads(META.read_text()) if META.exists() else {"last_ds": "2024-01-01"}
+RAW_GLOB = "data/raw/orders_*.parquet"
+OUT = Path("data/out/orders_daily_incr")  # one ds=YYYY-MM-DD partition per day
 
-con = dd.connect(":memory:")
-con.execute("CREATE VIEW orders AS SELECT * FROM read_parquet('data/raw/orders_*.parquet')")
+state = load_manifest(META)
 
-# Find new partition window
-last = state["last_ds"]
-result = con.execute("SELECT max(ds)::VARCHAR FROM orders").fetchone()
-new_max = result[0] if result else None
+# Find new work from filesystem metadata alone: unseen or changed files
+pending, dropped = discover(RAW_GLOB, state)
 
 # Nothing to do
-if not new_max or new_max <= last:
+if not pending and not dropped:
     print("No new partitions"); raise SystemExit(0)
 
-# Process only new days
-con.execute("""
+con = get_connection()
+# Partitions touched by this run: every ds in the new files, plus the old range of any file that
+# changed or was deleted
+affected = affected_partitions(con, pending, state, dropped)
+
+# Late-arriving data: a touched ds is recomputed from every file that covers it, not just the new ones
+sources = sorted({str(f) for f in pending} | covering_files(state, pending, affected))
+
+# Replace only the touched partitions; all others are left as they are
+for ds in affected:
+    shutil.rmtree(OUT / f"ds={ds}", ignore_errors=True)
+OUT.mkdir(parents=True, exist_ok=True)
+
+# No sources left: the touched partitions only held rows of deleted files
+if sources:
+    con.execute(f"""
 COPY (
   SELECT ds, order_status, COUNT(*) AS orders, SUM(total) AS gross
-  FROM orders
-  WHERE ds > ?
+  FROM read_parquet({file_list(sources)})
+  WHERE ds IN (SELECT unnest({sorted(affected)}::DATE[]))
   GROUP BY ALL
-) TO 'data/out/orders_daily_incr.parquet' (FORMAT PARQUET)
-""", [last])
+) TO '{OUT}' (FORMAT PARQUET, PARTITION_BY (ds), OVERWRITE_OR_IGNORE)
+""")
 
-state["last_ds"] = new_max
-META.write_text(json.dumps(state))
-print("Incremental publish →", new_max)
+# Record what was processed so the next run skips it
+record_files(con, state, pending)
+save_manifest(META, state)
 
+print(f"Incremental publish → {len(pending)} new files, {len(dropped)} removed, {len(affected)} partitions"
+      + (f" ({min(affected)} .. {max(affected)})" if affected else "") + f", watermark {state['last_ds']}")
@@ -0,0 +1,47 @@
+ZORDER_BITS = 16  # bits per column in the Z-order key
+
+# Raw orders are filtered by date and by customer, so cluster on both
+RAW_ORDERS = {"sort_by": ("ds", "customer_id")}
+CUSTOMER_DAILY = {"sort_by": ("customer_id",)}
+
+def morton(columns):
+    """Z-order key: interleave the bits of each column's dense rank"""
+    n = len(columns)
+    terms = " | ".join(
+        f"(((__rank_{j} >> i) & 1) << ({n} * i + {j}))" for j in range(n)
+    )
+    return f"list_sum([{terms} for i in range({ZORDER_BITS})])"
+
+def apply_layout(select_sql, layout=None):
+    """(query, COPY options) writing select_sql in a layout.
+
+    Row order and row-group size decide which row groups zone maps can skip. Layout keys:
+    sort_by (columns to ORDER BY), zorder (columns to cluster on a Z-order curve instead)
+    and row_group_size.
+    """
+    layout = layout or {}
+    query = select_sql
+    if layout.get("zorder"):
+        columns = layout["zorder"]
+        # Stretch every column's dense rank over the full bit range so each gets equal weight in the curve
+        top = 2 ** ZORDER_BITS - 1
+        ranks = ", ".join(f"dense_rank() OVER (ORDER BY {c}) - 1 AS __rank_{j}" for j, c in enumerate(columns))
+        scaled = ", ".join(
+            f"__rank_{j} * {top} // greatest(max(__rank_{j}) OVER (), 1) AS __rank_{j}" for j in range(len(columns))
+        )
+        excluded = ", ".join(f"__rank_{j}" for j in range(len(columns)))
+        query = f"""
+            SELECT * EXCLUDE ({excluded}) FROM (
+                SELECT * REPLACE ({scaled}) FROM (
+                    SELECT *, {ranks} FROM ({select_sql})
+                )
+            )
+            ORDER BY {morton(columns)}
+        """
+    elif layout.get("sort_by"):
+        query = f"SELECT * FROM ({select_sql}) ORDER BY {', '.join(layout['sort_by'])}"
+
+    options = ""
+    if layout.get("row_group_size"):
+        options += f", ROW_GROUP_SIZE {layout['row_group_size']}"
+    return query, options
@@ -0,0 +1,63 @@
+from datetime import date
+from pathlib import Path
+from catalog import refresh
+from connection import get_connection
+from layout import apply_layout
+from measure_read import run
+
+STAGE = Path("data/stage/layout")
+ROW_GROUP_SIZE = 2048  # DuckDB's smallest row group; keeps the fixture's groups numerous
+
+LAYOUTS = {
+    # The generator already writes raw orders sorted by (ds, customer_id), so the baseline is a
+    # deterministic shuffle of them rather than their order on disk
+    "shuffled": {"sort_by": ("hash(order_id, item_id)",)},
+    "sorted": {"sort_by": ("ds", "customer_id")},
+    "zorder": {"zorder": ("ds", "customer_id")},
+}
+
+# The date- and customer-filtered predicates from duckdb_sql.sql
+PREDICATES = {
+    "ds 2025-10-01..15": ("ds", date(2025, 10, 1), date(2025, 10, 15)),
+    "customer_id 1000..1499": ("customer_id", 1000, 1499),
+}
+
+def write_layouts(con):
+    """The raw orders rewritten once per layout, one file each"""
+    STAGE.mkdir(parents=True, exist_ok=True)
+    for name, layout in LAYOUTS.items():
+        query, options = apply_layout(
+            "SELECT * FROM read_parquet('data/raw/orders_*.parquet')",
+            {**layout, "row_group_size": ROW_GROUP_SIZE},
+        )
+        con.execute(f"COPY ({query}) TO '{STAGE / f'{name}.parquet'}' (FORMAT PARQUET, COMPRESSION ZSTD{options})")
+
+def row_groups(con, name, column, lo, hi):
+    """(row groups whose zone map overlaps [lo, hi], total row groups) for one layout"""
+    sql_type = {date: "DATE", int: "BIGINT"}[type(lo)]
+    return con.execute(f"""
+        SELECT
+            COUNT(*) FILTER (WHERE TRY_CAST(min_value AS {sql_type}) <= $hi::{sql_type}
+                               AND TRY_CAST(max_value AS {sql_type}) >= $lo::{sql_type}),
+            COUNT(*)
+        FROM file_stats
+        WHERE file = $file AND column_name = $column
+    """, {"file": str(STAGE / f"{name}.parquet"), "column": column, "lo": lo, "hi": hi}).fetchone()
+
+def main():
+    con = get_connection()
+    write_layouts(con)
+    refresh(con, str(STAGE / "*.parquet"), catalog=STAGE / "file_stats.parquet")
+
+    print(f"{'layout':<10} {'predicate':<24} {'read':>6} {'skipped':>8} {'seconds':>8}")
+    for name in LAYOUTS:
+        for label, (column, lo, hi) in PREDICATES.items():
+            read, total = row_groups(con, name, column, lo, hi)
+            secs, _ = run(f"""
+                SELECT SUM(total) FROM read_parquet('{STAGE / f'{name}.parquet'}')
+                WHERE {column} BETWEEN '{lo}' AND '{hi}'
+            """)
+            print(f"{name:<10} {label:<24} {read:>6} {total - read:>8} {secs:>8.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+
+def load_manifest(path):
+    """Read the processed-files manifest (older meta.json files only carry last_ds)"""
+    state = json.loads(path.read_text()) if path.exists() else {"last_ds": "2024-01-01"}
+    state.setdefault("files", {})
+    return state
+
+def save_manifest(path, state):
+    """Write the manifest through a temp file so a crash never leaves it half-written"""
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2, sort_keys=True))
+    tmp.replace(path)
+
+def fingerprint(path):
+    """Size and mtime: enough to tell a file changed without opening it"""
+    stat = path.stat()
+    return {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+def discover(pattern, state):
+    """Files matching the glob that are new or changed since the manifest was written, and the
+    manifest entries of files that are gone"""
+    # Files that disappeared (e.g. merged by compact.py) no longer cover any ds, but the partitions
+    # they fed still hold their rows until recomputed
+    dropped = {p: state["files"].pop(p) for p in list(state["files"]) if not Path(p).exists()}
+
+    pending = []
+    for path in sorted(Path().glob(pattern)):
+        seen = state["files"].get(str(path))
+        if seen is None or {"size": seen["size"], "mtime": seen["mtime"]} != fingerprint(path):
+            pending.append(path)
+    return pending, dropped
+
+def file_list(files):
+    """Render paths as a DuckDB list literal for read_parquet (views and COPY cannot take parameters)"""
+    return "[" + ", ".join("'" + str(f).replace("'", "''") + "'" for f in files) + "]"
+
+def footer_stats(con, files, column="ds"):
+    """Row count and min/max of one column per file, read from Parquet footers only"""
+    if not files:
+        return {}
+    # ISO dates compare correctly as the strings the footer stores
+    rows = con.execute(f"""
+        SELECT file_name,
+               SUM(row_group_num_rows)  AS rows,
+               MIN(stats_min_value)     AS min_value,
+               MAX(stats_max_value)     AS max_value
+        FROM parquet_metadata({file_list(files)})
+        WHERE path_in_schema = '{column}'
+        GROUP BY file_name
+    """).fetchall()
+    return {
+        file_name: {"rows": n, f"min_{column}": lo, f"max_{column}": hi}
+        for file_name, n, lo, hi in rows
+    }
+
+def affected_partitions(con, pending, state, dropped):
+    """ds values a run must rewrite: every ds in the pending files, plus the old range of any that
+    changed and of the dropped ones"""
+    affected = {ds for (ds,) in con.execute(
+        f"SELECT DISTINCT ds::VARCHAR FROM read_parquet({file_list(pending)})"
+    ).fetchall()} if pending else set()
+    for seen in [state["files"].get(str(f)) for f in pending] + list(dropped.values()):
+        if seen and seen["min_ds"] is not None:
+            affected |= {ds for (ds,) in con.execute(
+                "SELECT generate_series::DATE::VARCHAR FROM generate_series(?::DATE, ?::DATE, INTERVAL 1 DAY)",
+                [seen["min_ds"], seen["max_ds"]],
+            ).fetchall()}
+    return affected
+
+def covering_files(state, pending, affected):
+    """Already-processed files whose ds range overlaps an affected ds"""
+    pending = {str(f) for f in pending}
+    return {
+        path for path, seen in state["files"].items()
+        if path not in pending and seen["min_ds"] is not None
+        and any(seen["min_ds"] <= ds <= seen["max_ds"] for ds in affected)
+    }
+
+def record_files(con, state, files):
+    """Mark files processed: their fingerprint, footer row count and ds range, and the new watermark"""
+    stats = footer_stats(con, files)
+    for f in files:
+        seen = stats.get(str(f))
+        if seen is None or seen["min_ds"] is None:
+            # No ds statistics in the footer (an empty file, or one written without them): read the
+            # column instead. An empty file is recorded with no range and covers no ds
+            rows, lo, hi = con.execute(
+                f"SELECT count(*), min(ds)::VARCHAR, max(ds)::VARCHAR FROM read_parquet({file_list([f])})"
+            ).fetchone()
+            seen = {"rows": rows, "min_ds": lo, "max_ds": hi}
+        state["files"][str(f)] = {**fingerprint(f), **seen}
+    state["last_ds"] = max((seen["max_ds"] for seen in state["files"].values() if seen["max_ds"]),
+                           default=state["last_ds"])
@@ -0,0 +1,150 @@
+import glob
+import hashlib
+import inspect
+import json
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import connection
+import profiling
+from manifest import fingerprint, save_manifest
+
+STATE = Path("data/stage/pipeline.json")  # stage -> fingerprint and outputs of its last successful run
+WORKERS = 4  # stages run at once, each on its own cursor of the shared connection
+
+def stage(name, run, inputs=(), after=(), outputs=(), version=()):
+    """A pipeline stage.
+
+    run is SQL text or a function taking a cursor; a function may return the paths it wrote,
+    otherwise what outputs matches once it has run is taken as written. inputs and outputs are file
+    globs, after names the stages whose tables or views it reads, and version holds the runtime
+    values (a mode, a setting) its output depends on besides code and inputs. Only a stage with
+    outputs can be skipped, and only while every path it wrote is still there: tables and views do
+    not outlive the process, so everything upstream of a stage that runs runs too.
+    """
+    return {"name": name, "run": run, "inputs": tuple(inputs), "after": tuple(after), "outputs": tuple(outputs),
+            "version": tuple(version)}
+
+def ordered(stages):
+    """stages in dependency order"""
+    by_name = {s["name"]: s for s in stages}
+    result, seen = [], set()
+    def visit(s, path=()):
+        if s["name"] in path:
+            raise ValueError(f"Cycle through stage {s['name']}")
+        if s["name"] in seen:
+            return
+        for name in s["after"]:
+            if name not in by_name:
+                raise ValueError(f"Stage {s['name']} runs after unknown stage {name}")
+            visit(by_name[name], path + (s["name"],))
+        seen.add(s["name"])
+        result.append(s)
+    for s in stages:
+        visit(s)
+    return result
+
+def local_modules(module):
+    """module and the modules of this directory it uses, directly or through one another, by name"""
+    here = Path(__file__).parent
+    found = {}
+    def visit(m):
+        if m.__name__ in found:
+            return
+        found[m.__name__] = m
+        for value in vars(m).values():
+            used = value if inspect.ismodule(value) else inspect.getmodule(value)
+            if used is not None and Path(getattr(used, "__file__", None) or "/").parent == here:
+                visit(used)
+    visit(module)
+    return [found[name] for name in sorted(found)]
+
+def code(run):
+    """SQL text as is; for a function, the source of its module and of the local modules that uses,
+    so module-level settings (LAYOUT, checks, enums) and helpers count as the stage's code"""
+    if isinstance(run, str):
+        return run
+    return "".join(inspect.getsource(m) for m in local_modules(inspect.getmodule(run)))
+
+def fingerprints(stages):
+    """Per stage: a hash of its code, the profile and its version values, its input files' size/mtime
+    and its upstream fingerprints"""
+    result = {}
+    for s in ordered(stages):
+        h = hashlib.sha256(code(s["run"]).encode())
+        h.update(json.dumps([connection.PROFILE, connection.SETTINGS, s["version"]], default=str).encode())
+        for path in sorted(p for pattern in s["inputs"] for p in glob.glob(pattern)):
+            h.update(json.dumps([path, fingerprint(Path(path))]).encode())
+        for name in s["after"]:
+            h.update(result[name].encode())
+        result[s["name"]] = h.hexdigest()
+    return result
+
+def run_stage(con, s):
+    """Run a stage; returns the paths it wrote"""
+    cur = profiling.ProfiledCursor(con.cursor())
+    try:
+        with profiling.stage(s["name"], cur):
+            if isinstance(s["run"], str):
+                cur.execute(s["run"])
+                written = None
+            else:
+                written = s["run"](cur)
+    finally:
+        cur.close()
+    if written is None:
+        written = [p for pattern in s["outputs"] for p in glob.glob(pattern)]
+    return sorted(str(p) for p in written)
+
+def run_dag(stages, workers=WORKERS, state_path=STATE, force=False):
+    """Run the stages whose outputs are missing or stale (every stage if force), independent ones concurrently"""
+    stages = ordered(stages)
+    by_name = {s["name"]: s for s in stages}
+    current = fingerprints(stages)
+    state = json.loads(state_path.read_text()) if state_path.exists() else {}
+
+    def fresh(s):
+        seen = state.get(s["name"])
+        return (not force and s["outputs"] and isinstance(seen, dict) and seen["fingerprint"] == current[s["name"]]
+                and seen["outputs"] and all(Path(p).exists() for p in seen["outputs"]))
+
+    todo = set()
+    def need(name):
+        if name not in todo:
+            todo.add(name)
+            for upstream in by_name[name]["after"]:
+                need(upstream)
+
+    # Stages with outputs, and sinks (whose work is their side effect), are what a run is for
+    upstream_of_something = {name for s in stages for name in s["after"]}
+    for s in stages:
+        if (s["outputs"] or s["name"] not in upstream_of_something) and not fresh(s):
+            need(s["name"])
+    for s in stages:
+        if s["name"] not in todo:
+            print(f"{s['name']}: unchanged, skipped")
+
+    con = connection.get_connection()
+    done, running = set(), {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while len(done) < len(todo):
+            for s in stages:
+                if (s["name"] in todo and s["name"] not in done and s["name"] not in running.values()
+                        and all(name in done for name in s["after"])):
+                    running[pool.submit(run_stage, con, s)] = s["name"]
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                written = future.result()  # re-raises the stage's error; its dependents never start
+                done.add(name)
+                if by_name[name]["outputs"]:
+                    state[name] = {"fingerprint": current[name], "outputs": written}
+                    state_path.parent.mkdir(parents=True, exist_ok=True)
+                    save_manifest(state_path, state)
+    profiling.write_run_log()
+    return done
+
+if __name__ == "__main__":
+    import etl, etl_orders
+    # The life expectancy and orders pipelines share no stage, so they run side by side
+    run_dag(etl.STAGES + etl_orders.STAGES)
+    connection.close_connections()
@@ -0,0 +1,144 @@
+import json, resource, sys, time, uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from connection import get_connection
+
+RUN_LOG = Path("data/runlog")  # one Parquet file per run, read back together as the run log
+REGRESSION = 1.25              # diff flags a stage whose metric grew by more than this factor
+METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_mb", "rows_in", "rows_out")
+# Only these can regress: more rows just means more input
+FLAGGED = ("wall_seconds", "cpu_seconds", "peak_rss_mb")
+
+RUN = []  # stage records of the current process, written out by write_run_log()
+
+def peak_rss_mb():
+    """High-water resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KB on Linux
+
+def bytes_read():
+    """Bytes this process has read from files so far, None where /proc/self/io is missing.
+
+    DuckDB's profile total_bytes_read counts only part of a Parquet scan's reads (the footers),
+    so the volume a scan decodes is measured on the process instead.
+    """
+    try:
+        with open("/proc/self/io") as f:
+            return int(dict(line.split(": ") for line in f.read().splitlines())["rchar"])
+    except OSError:
+        return None
+
+class ProfiledCursor:
+    """A cursor that keeps DuckDB's JSON profile of every query executed through it.
+
+    A query's profile is complete only once its result has been fetched, so each one is
+    collected when the next query starts, or by finish().
+    """
+    def __init__(self, cur):
+        self.cur = cur
+        self.cur.execute("SET enable_profiling = 'no_output'")
+        self.profiles = []
+        self.pending = False
+
+    def collect(self):
+        if self.pending:
+            self.profiles.append(json.loads(self.cur.get_profiling_information(format="json")))
+            self.pending = False
+
+    def execute(self, query, parameters=None):
+        self.collect()
+        result = self.cur.execute(query, parameters)
+        self.pending = True
+        return result
+
+    def finish(self):
+        self.collect()
+        return self.profiles
+
+    def __getattr__(self, name):
+        return getattr(self.cur, name)
+
+def rows_out(profile):
+    """Rows the query produced: for CREATE TABLE AS / COPY / INSERT, the rows fed into the sink"""
+    root = profile["children"][0] if profile.get("children") else {}
+    if root.get("operator_name") in ("CREATE_TABLE_AS", "COPY_TO_FILE", "INSERT") and root["children"]:
+        root = root["children"][0]
+    return root.get("operator_cardinality", 0)
+
+@contextmanager
+def stage(name, cur=None):
+    """Record a stage's wall and CPU time, the process's peak RSS so far (stages run concurrently and
+    share the process, so a stage can show an earlier stage's peak) and, given a
+    ProfiledCursor, rows in/out and the JSON profile of each query it ran"""
+    t0, c0 = time.perf_counter(), time.process_time()
+    yield
+    profiles = cur.finish() if cur is not None else []
+    record = {
+        "stage": name,
+        "wall_seconds": time.perf_counter() - t0,
+        "cpu_seconds": time.process_time() - c0,  # whole process, DuckDB's worker threads included
+        "peak_rss_mb": peak_rss_mb(),
+        "rows_in": sum(p.get("cumulative_rows_scanned", 0) for p in profiles),
+        "rows_out": sum(rows_out(p) for p in profiles),
+        "queries": len(profiles),
+        "profile": json.dumps(profiles),
+    }
+    RUN.append(record)
+    print(f"{name}: {record['wall_seconds']:.2f}s, cpu {record['cpu_seconds']:.2f}s, "
+          f"process peak RSS {record['peak_rss_mb']:.0f} MB"
+          + (f", {record['rows_in']} rows in, {record['rows_out']} out"
+             if profiles else ""))
+
+def write_run_log():
+    """Append this process's stage records to the run log as one Parquet file; returns the run id"""
+    if not RUN:
+        return None
+    import pyarrow as pa, pyarrow.parquet as pq  # imported late: it would inflate every stage's peak RSS
+    run_id = f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+    RUN_LOG.mkdir(parents=True, exist_ok=True)
+    rows = [{"run_id": run_id, "logged_at": datetime.now(), **record} for record in RUN]
+    pq.write_table(pa.Table.from_pylist(rows), RUN_LOG / f"run_{run_id}.parquet", compression="zstd")
+    RUN.clear()
+    print(f"OK → run {run_id} logged to {RUN_LOG}")
+    return run_id
+
+def diff_runs(con, base=None, new=None):
+    """Per-stage metrics of two runs (default: the last two) side by side, regressions flagged"""
+    log = f"read_parquet('{RUN_LOG / '*.parquet'}', union_by_name = true)"
+    if base is None or new is None:
+        runs = [r for (r,) in con.execute(
+            f"SELECT run_id FROM {log} GROUP BY run_id ORDER BY min(logged_at) DESC LIMIT 2"
+        ).fetchall()]
+        if len(runs) < 2:
+            raise ValueError(f"Need two runs in {RUN_LOG} to diff, found {len(runs)}")
+        new, base = runs
+    rows = con.execute(f"""
+        SELECT stage, {', '.join(f'b.{m}, n.{m}' for m in METRICS)}
+        FROM (SELECT * FROM {log} WHERE run_id = $base) b
+        JOIN (SELECT * FROM {log} WHERE run_id = $new) n USING (stage)
+        ORDER BY stage
+    """, {"base": base, "new": new}).fetchall()
+
+    print(f"{base} → {new}")
+    regressions = []
+    for stage_name, *values in rows:
+        before = dict(zip(METRICS, values[0::2]))
+        after = dict(zip(METRICS, values[1::2]))
+        for metric in FLAGGED:
+            # Sub-10ms timings are noise, not regressions
+            if (before[metric] and after[metric] > before[metric] * REGRESSION
+                    and not (metric.endswith("seconds") and after[metric] < 0.01)):
+                regressions.append((stage_name, metric, before[metric], after[metric]))
+        print(f"  {stage_name:<28} " + "  ".join(
+            f"{m} {b:.2f}→{a:.2f}" if isinstance(b, float) else f"{m} {b}→{a}"
+            for m, b, a in zip(METRICS, values[0::2], values[1::2])
+        ))
+    for stage_name, metric, before, after in regressions:
+        print(f"⚠ {stage_name}: {metric} {before:.2f} → {after:.2f} (x{after / before:.2f})")
+    return regressions
+
+if __name__ == "__main__":
+    # python profiling.py [BASE_RUN NEW_RUN]: diff two logged runs, the last two by default
+    regressions = diff_runs(get_connection(), *sys.argv[1:3])
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,120 @@
+import argparse
+import time
+from catalog import refresh, catalog_for, CATALOG, RAW_GLOB
+from checks import sql_literal
+from connection import get_connection, load_table
+from manifest import file_list
+from profiling import ProfiledCursor, bytes_read
+
+def key_set(con, dim_sql, key):
+    """The dimension's distinct keys as a TEMP table, private to con and gone with it;
+    returns (table, min key, max key, key count)"""
+    table = f"dim_keys_{key}"
+    con.execute(f"CREATE OR REPLACE TEMP TABLE {table} AS SELECT DISTINCT {key} FROM ({dim_sql}) WHERE {key} IS NOT NULL")
+    lo, hi, n = con.execute(f"SELECT min({key}), max({key}), count(*) FROM {table}").fetchone()
+    return table, lo, hi, n
+
+def files_with_keys(con, pattern, key, table, catalog=CATALOG):
+    """Files with a row group whose footer [min, max] of key contains at least one dimension key"""
+    refresh(con, pattern, catalog)
+    sql_type = con.execute(f"SELECT typeof({key}) FROM {table} LIMIT 1").fetchone()[0]
+    rows = con.execute(f"""
+        SELECT DISTINCT s.file
+        FROM file_stats s
+        WHERE s.column_name = $key
+          AND EXISTS (
+              SELECT 1 FROM {table} k
+              WHERE k.{key} BETWEEN TRY_CAST(s.min_value AS {sql_type}) AND TRY_CAST(s.max_value AS {sql_type})
+          )
+        ORDER BY s.file
+    """, {"key": key}).fetchall()
+    return [file for (file,) in rows]
+
+def semi_join_scan(con, pattern, key, dim_sql, catalog=CATALOG, hive_partitioning=False):
+    """The fact scan reduced to rows whose key is in the dimension, for a big-fact/small-dimension join.
+
+    The dimension's key set is built first and pushed down three ways: files whose footer ranges
+    hold none of the keys are never opened, the key range becomes a literal filter the reader
+    checks against zone maps, and a semi join on the key set drops misses straight off the scan.
+    The key set is a TEMP table of con, so the scan must run on con (e.g. the same cursor).
+    """
+    table, lo, hi, n = key_set(con, dim_sql, key)
+    hive = ", hive_partitioning = true" if hive_partitioning else ""
+    files = files_with_keys(con, pattern, key, table, catalog) if n else []
+    if not files:
+        # Keep the schema so the surrounding query still binds
+        return f"(SELECT * FROM read_parquet('{pattern}'{hive}) LIMIT 0)"
+    return f"""(
+        SELECT * FROM read_parquet({file_list(files)}{hive})
+        WHERE {key} BETWEEN {sql_literal(lo)} AND {sql_literal(hi)}
+          AND {key} IN (SELECT {key} FROM {table})
+    )"""
+
+# Dimension slices to benchmark: the whole dimension, a selective one with keys spread over the
+# whole id range, and a selective one whose keys are a narrow range
+DIMENSIONS = {
+    "all customers": "SELECT * FROM dim_customer",
+    "Enterprise/North": "SELECT * FROM dim_customer WHERE segment = 'Enterprise' AND region = 'North'",
+    "customer_id < 1500": "SELECT * FROM dim_customer WHERE customer_id < 1500",
+}
+
+JOIN = """
+    SELECT count(*), sum(gross) FROM (
+        SELECT f.ds, f.customer_id, d.segment, SUM(f.total) AS gross
+        FROM {orders} f
+        JOIN ({dim}) d USING (customer_id)
+        GROUP BY ALL
+    )
+"""
+
+def scanned(profile, operator="READ_PARQUET"):
+    """(files read, rows scanned, rows emitted) summed over the profile's Parquet scans"""
+    totals = [0, 0, 0]
+    for child in profile.get("children", []):
+        if child.get("operator_name") == operator:
+            totals[0] += int(child.get("extra_info", {}).get("Total Files Read", 0))
+            totals[1] += child.get("operator_rows_scanned", 0)
+            totals[2] += child.get("operator_cardinality", 0)
+        totals = [a + b for a, b in zip(totals, scanned(child, operator))]
+    return totals
+
+def benchmark(pattern):
+    """Files opened, rows and bytes decoded and rows handed to the join, per dimension slice and strategy"""
+    con = get_connection()
+    # Every strategy reads the files itself rather than from what the one before it cached
+    con.execute("SET enable_external_file_cache = false")
+    load_table(con, "dim_customer", "data/dim_customer.parquet")
+    # A catalog per fact dataset, so benchmarking another layout leaves data/raw's catalog alone
+    catalog = catalog_for(pattern)
+    print(f"{'dimension':<20} {'strategy':<20} {'files':>6} {'rows scanned':>13} {'MB read':>8} "
+          f"{'rows out':>10} {'seconds':>8}")
+    for label, dim_sql in DIMENSIONS.items():
+        # strategy -> (fact scan built on the query's own cursor, setting)
+        strategies = {
+            "no join filter": (lambda cur: f"read_parquet('{pattern}')", "SET disabled_optimizers = 'join_filter_pushdown'"),
+            "dynamic min/max": (lambda cur: f"read_parquet('{pattern}')", "RESET disabled_optimizers"),
+            "semi-join pushdown": (lambda cur: semi_join_scan(cur, pattern, "customer_id", dim_sql, catalog),
+                                   "RESET disabled_optimizers"),
+        }
+        for strategy, (orders, setting) in strategies.items():
+            cur = ProfiledCursor(con.cursor())
+            try:
+                # Built outside the profiled cursor, so the profile holds just the join
+                scan = orders(cur.cur)
+                cur.cur.execute(setting)
+                t0, b0 = time.perf_counter(), bytes_read()
+                result = cur.execute(JOIN.format(orders=scan, dim=dim_sql)).fetchone()
+                seconds = time.perf_counter() - t0
+                read = bytes_read() - b0 if b0 is not None else None
+                profile = cur.finish()[0]
+            finally:
+                cur.close()  # and with it the cursor's TEMP key set
+            files, rows_scanned, rows_out = scanned(profile)
+            megabytes = f"{read / 1e6:.1f}" if read is not None else "n/a"
+            print(f"{label:<20} {strategy:<20} {files:>6} {rows_scanned:>13} {megabytes:>8} "
+                  f"{rows_out:>10} {seconds:>8.3f}   {result}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Files and rows decoded by a big-fact/small-dimension join, with and without key pushdown")
+    parser.add_argument("--pattern", default=RAW_GLOB, help="fact files, e.g. data/stage/layout/sorted.parquet")
+    benchmark(parser.parse_args().pattern)